@@ -0,0 +1,893 @@
+#! /usr/bin/python
+
+# fio-exec.py - execute the fio job files of a run plan generated by fio-gen.py and
+# summarize the JSON output of every run into csv files.
+#
+# fio-gen.py copies this script, fio-j2csv.py and the run plan (fio-plan.json) into its
+# output folder next to the .fio job files; the folder is self contained and only needs
+# the python standard library and fio to execute:
+#
+#   ./fio-exec.py                  - run every workload in plan order.
+#   ./fio-exec.py -s block_sweep   - run the workloads of a single sequence, in order.
+#   ./fio-exec.py -s all_rd,all_wr - run several sequences back to back.
+#
+# Each execution writes into its own timestamped run directory, json/<YYYYmmdd-HHMMSS>/,
+# and json/latest points at the newest one; earlier results are kept.  The fio logs of a
+# finished run are gzipped by a low priority background process while the next one runs,
+# and only our own output files are fsync'ed, there is no system wide sync between runs.
+# A run listed again, e.g. by two of the selected sequences, writes <id>.<n>.json on its
+# later executions, n its position in the run list.
+#
+# Runs with the same fingerprint (identical job and guards) execute once per device state
+# and later references share that result; the device state changes with every run that
+# writes to the targets (a fill, sequential or random write), so only runs with no write
+# between them share a result.  A fill is skipped when its targets are still
+# preconditioned, i.e. no random write ran on them since their last fill; see fio-gen.py
+# -O for sequence ordering that needs a single fill.
+#
+# Every run is recorded in an append-only journal (fio-journal.json) as it starts and
+# ends.  After a crash or reboot, --resume keeps the json output, replays the finished
+# runs from the journal and restarts at the interrupted one:
+#
+#   ./fio-exec.py -s all --resume                  - continue an interrupted campaign.
+#   ./fio-exec.py -s all --resume --reprecondition - refill the targets first when the
+#                                                    interrupted run wrote to them.
+#
+# From the parent folder of a multi target group generation (fio-gen.py -t all) this
+# schedules the target group subfolders, each executed by its own copy of this script.
+# Every device is a lock: groups with disjoint devices run at the same time with
+# "-m concurrent" (aggregate controller load), one at a time with "-m isolate":
+#
+#   ./fio-exec.py -g all -m concurrent -s all       - every group, disjoint ones in parallel.
+#   ./fio-exec.py -g d4_b2e,d4_f2i -m isolate       - the listed groups, one after the other.
+#
+# fio reports its progress every -i seconds (--status-interval, 10 by default, 0 for
+# none); each interval's IOPS, bandwidth and mean completion latency are printed live and
+# kept as a time series, json/<timestamp>/<run>.ts.csv, next to the final json output.
+#
+# Instead of a fixed number of repeats, -r repeats each workload until the 95% confidence
+# interval of its IOPS and bandwidth is within +-PCT of the mean, between --repeat-min
+# and --repeat-max runs; mean, standard deviation and interval go to json/repeats.csv:
+#
+#   ./fio-exec.py -s all -r 5 --repeat-max 8        - stable workloads stop after 2 runs.
+#
+
+import subprocess
+import json
+import argparse
+import hashlib
+import os, sys
+import glob
+import shutil
+import time
+import math
+from distutils.spawn import find_executable
+
+CFG_DEF_PLAN_FILE = "fio-plan.json";
+# Results history kept across executions, read back by fio-gen.py to project run times.
+CFG_HISTORY_FILE  = "fio-history.csv";
+# Append-only record of the runs of the current execution, see AddJournal.
+CFG_JOURNAL_FILE  = "fio-journal.json";
+# Output of each target group executed by ScheduleGroups, in the group's folder.
+CFG_GROUP_LOG     = "fio-exec.out";
+# Pointer to the newest run directory in the output folder, see NewRunFolder.
+CFG_LATEST_LINK   = "latest";
+# Default seconds between fio status reports, see StreamFio.
+CFG_DEF_INTERVAL  = 10;
+# Target group scheduling modes of ScheduleGroups.
+SCHEDULE_MODES    = [ "isolate", "concurrent" ];
+# Default minimum and maximum runs of a workload repeated with -r, see RepeatRun.
+CFG_DEF_REPEAT_MIN = 2;
+CFG_DEF_REPEAT_MAX = 5;
+# Two sided 95% Student t quantiles for 1 to 30 degrees of freedom, see RepeatStats.
+T_95 = [ 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042 ];
+
+# Input arguments
+def AddArgs(parser_obj):
+   parser_obj.add_argument('-s', dest='CfgSequence', action='store', required=False, default=None, help='Specify sequence(s) to execute, comma separated; all workloads in plan order by default.');
+   parser_obj.add_argument('-p', dest='CfgPlanFile', action='store', required=False, default=CFG_DEF_PLAN_FILE, help='Run plan generated by fio-gen.py; %s by default.' % (CFG_DEF_PLAN_FILE));
+   parser_obj.add_argument('--resume', dest='CfgResume', action='store_true', required=False, default=False, help='Resume an interrupted execution from its journal (%s), skipping the runs that completed.' % (CFG_JOURNAL_FILE));
+   parser_obj.add_argument('-i', dest='CfgInterval', action='store', required=False, type=int, default=CFG_DEF_INTERVAL, help='Seconds between live fio status reports, saved as a time series; 0 disables them.  %d by default.' % (CFG_DEF_INTERVAL));
+   parser_obj.add_argument('-g', dest='CfgGroups', action='store', required=False, default=None, help='Execute target group subfolders (comma separated, or "all") of a multi group generation.');
+   parser_obj.add_argument('-m', dest='CfgMode', action='store', required=False, default="isolate", choices=SCHEDULE_MODES, help='With -g, run groups with disjoint devices concurrently, or isolate each group; isolate by default.');
+   parser_obj.add_argument('-r', dest='CfgRepeatCi', action='store', required=False, type=float, default=0.0, help='Repeat each workload until the 95%% confidence interval of its IOPS and bandwidth is within +-PCT of the mean; 0 (default) runs each workload once.');
+   parser_obj.add_argument('--repeat-min', dest='CfgRepeatMin', action='store', required=False, type=int, default=CFG_DEF_REPEAT_MIN, help='With -r, minimum runs of a workload; %d by default.' % (CFG_DEF_REPEAT_MIN));
+   parser_obj.add_argument('--repeat-max', dest='CfgRepeatMax', action='store', required=False, type=int, default=CFG_DEF_REPEAT_MAX, help='With -r, maximum runs of a workload; %d by default.' % (CFG_DEF_REPEAT_MAX));
+   parser_obj.add_argument('--reprecondition', dest='CfgRefill', action='store_true', required=False, default=False, help='With --resume, fill the targets again before restarting an interrupted run that wrote to them.');
+
+def GetArgs():
+   # create the top-level parser
+   parser = argparse.ArgumentParser(description='fio complex workload executor input arguments.');
+   AddArgs(parser);
+   # parse the args and call whatever function was selected
+   args = parser.parse_args();
+   return args;
+
+#############################################
+
+def LoadPlan(plan_file):
+   if (not os.path.exists(plan_file)):
+      print "ERR: run plan %s not found; generate it with fio-gen.py." % (plan_file);
+      raise SystemExit(1);
+   in_file = open(plan_file, 'r');
+   plan    = json.load(in_file);
+   in_file.close();
+   return plan;
+
+# VerifyPlan - warn about job files that changed since the plan was generated.
+def VerifyPlan(plan):
+   for run in plan['runs']:
+      if (not os.path.exists(run['file'])):
+         print "ERR: job file %s of the run plan is missing." % (run['file']);
+         raise SystemExit(1);
+      in_file = open(run['file'], 'r');
+      sha1    = hashlib.sha1(in_file.read()).hexdigest();
+      in_file.close();
+      if (sha1 != run['sha1']):
+         print "WARNING: job file %s was modified after it was generated." % (run['file']);
+
+# SelectRuns - runs of the requested sequences, in sequence order, or all runs, and the
+#              sequence each run was selected by.
+def SelectRuns(plan, sequence):
+   if (sequence is None):
+      return [ plan['runs'], [ None ] * len(plan['runs']) ];
+   run_index = dict([ [ run['id'], run ] for run in plan['runs'] ]);
+   run_list  = [];
+   seq_list  = [];
+   for seq_name in sequence.split(','):
+      if (not plan['sequences'].has_key(seq_name)):
+         print "ERR: unknown sequence %s; choose from %s" % (seq_name, ", ".join(sorted(plan['sequences'].keys())));
+         raise SystemExit(1);
+      run_list.extend([ run_index[run_id] for run_id in plan['sequences'][seq_name] ]);
+      seq_list.extend([ seq_name ] * len(plan['sequences'][seq_name]));
+   return [ run_list, seq_list ];
+
+#############################################
+
+# CollectLogs - move the lat/iops/bw/hist logs fio wrote to the working folder next to
+#               the json output, prefixed with the run name when fio named them otherwise.
+#               Returns the moved logs.
+def CollectLogs(run_name):
+   log_list = [];
+   for log_file in glob.glob("*.log") + glob.glob("*.log.fz"):
+      if (log_file.startswith(run_name)):
+         log_list.append("%s/%s" % (out_folder, log_file));
+      else:
+         log_list.append("%s/%s_%s" % (out_folder, run_name, log_file));
+      shutil.move(log_file, log_list[-1]);
+   return log_list;
+
+# CompressLogs - queue logs for gzip, done one batch at a time by a background process at
+#                idle IO and lowest CPU priority so it does not disturb the next run; with
+#                wait set, drain the queue before returning.
+def CompressLogs(log_list=[], wait=False):
+   global compress_proc;
+   compress_queue.extend(log_list);
+   while (True):
+      if ((compress_proc is not None) and (compress_proc.poll() is None)):
+         if (not wait):
+            return;
+         compress_proc.wait();
+      compress_proc = None;
+      if (len(compress_queue) == 0):
+         return;
+      nice_cmd = [ "nice", "-n", "19" ];
+      if (find_executable("ionice") is not None):
+         nice_cmd = [ "ionice", "-c", "3" ] + nice_cmd;
+      compress_proc = subprocess.Popen(nice_cmd + [ "gzip", "-f" ] + compress_queue);
+      del compress_queue[:];
+
+# SyncFiles - force our own output files, and their folder entries, to disk.
+def SyncFiles(file_list):
+   folders = set();
+   for file_name in file_list:
+      if (not os.path.exists(file_name)):
+         continue;
+      out_fd = os.open(file_name, os.O_RDONLY);
+      os.fsync(out_fd);
+      os.close(out_fd);
+      folders.add(os.path.dirname(file_name) or ".");
+   for folder in folders:
+      out_fd = os.open(folder, os.O_RDONLY);
+      os.fsync(out_fd);
+      os.close(out_fd);
+
+# NewRunFolder - create a timestamped run directory in the output folder and point
+#                <output folder>/latest at it.
+def NewRunFolder(out_root):
+   run_name = time.strftime("%Y%m%d-%H%M%S");
+   suffix   = 1;
+   while (os.path.exists("%s/%s" % (out_root, run_name))):
+      suffix  += 1;
+      run_name = "%s.%d" % (time.strftime("%Y%m%d-%H%M%S"), suffix);
+   os.makedirs("%s/%s" % (out_root, run_name));
+   # replace the pointer atomically, a reader never sees it missing
+   link_file = "%s/%s" % (out_root, CFG_LATEST_LINK);
+   if (os.path.lexists(link_file + ".new")):
+      os.remove(link_file + ".new");
+   os.symlink(run_name, link_file + ".new");
+   os.rename(link_file + ".new", link_file);
+   SyncFiles([ "%s/%s" % (out_root, run_name) ]);
+   return "%s/%s" % (out_root, run_name);
+
+def RunFio(run, json_file, env_vars={}):
+   env = dict(os.environ);
+   env.update(run.get('env', {}));
+   env.update(env_vars);
+   if (args.CfgInterval > 0):
+      exit_code = StreamFio(run, json_file, env);
+   else:
+      exit_code = subprocess.call("fio %s --output-format=json --output %s" % (run['file'], json_file), shell=True, env=env);
+   run_name = os.path.basename(json_file)[:-len(".json")];
+   SyncFiles([ json_file, "%s/%s.ts.csv" % (os.path.dirname(json_file), run_name) ]);
+   # fio compresses its own logs with log_compression (.log.fz)
+   CompressLogs([ log_file for log_file in CollectLogs(run_name) if log_file.endswith(".log") ]);
+   j_data = None;
+   if ((exit_code == 0) and os.path.exists(json_file)):
+      try:
+         j_data = LoadJson(json_file);
+      except ValueError:
+         print "ERR: unreadable fio output %s" % (json_file);
+   return [ exit_code, j_data ];
+
+# IntervalTotals - [ seconds, read ios, write ios, read KiB, write KiB, read and write
+#                  completion latency sums (usec) ] of a cumulative fio status report.
+def IntervalTotals(report, seconds):
+   totals = [ seconds, 0, 0, 0, 0, 0.0, 0.0 ];
+   for job in report["jobs"]:
+      for index, io_dir in enumerate([ "read", "write" ]):
+         totals[1 + index] += job[io_dir].get("total_ios", 0);
+         totals[3 + index] += job[io_dir].get("io_kbytes", 0);
+         totals[5 + index] += job[io_dir].get("total_ios", 0) * GetClatUsec(job[io_dir], mean=True);
+   return totals;
+
+# ReportTime - seconds on fio's clock of a status report: its timestamp, or the longest
+#              job elapsed time of fio versions that report no timestamp.
+def ReportTime(report):
+   if (report.has_key("timestamp_ms")):
+      return report["timestamp_ms"] / 1000.0;
+   return float(max([ 0 ] + [ job.get("elapsed", 0) for job in report["jobs"] ]));
+
+# CheckGuards - reason the guard rails of a run trip on a status report, None when the
+#               run is within them or still in its grace period.  p99 latency is the
+#               cumulative percentile fio reports; IOPS those of the last interval.
+def CheckGuards(guards, report, iops, seconds):
+   if (seconds < guards['grace']):
+      return None;
+   if ((guards['min_iops'] is not None) and (iops < guards['min_iops'])):
+      return "IOPS %.0f below %.0f" % (iops, guards['min_iops']);
+   if (guards['max_p99_usec'] is not None):
+      p99 = max([ 0.0 ] + [ GetClatUsec(job[io_dir]) for job in report["jobs"] for io_dir in [ "read", "write" ] if (job[io_dir].get("total_ios", 0) > 0) ]);
+      if (p99 > guards['max_p99_usec']):
+         return "p99 clat %.0fus above %.0fus" % (p99, guards['max_p99_usec']);
+   if (guards['max_errors'] is not None):
+      errors = sum([ job.get("total_err", 0) + int(job.get("error", 0) != 0) for job in report["jobs"] ]);
+      if (errors > guards['max_errors']):
+         return "%d errors above %d" % (errors, guards['max_errors']);
+   return None;
+
+# StreamFio - run fio with periodic JSON status reports on its stdout, print the IOPS,
+#             bandwidth and mean completion latency of each interval and save them to
+#             <json>.ts.csv; the last report is fio's final output, saved to json_file
+#             and not taken as an interval, nor checked against the guard rails.
+#             Intervals are timed by fio's report timestamps.  fio is stopped when a
+#             report trips the run's guard rails, and the reason recorded in aborted.
+#             Returns fio's exit code, 127 when it cannot be started.
+def StreamFio(run, json_file, env):
+   guards   = None;
+   if ((not run.has_key('knee')) and (run.get('guards') is not None)):
+      guards = dict(run['guards']);
+      if (guards['grace'] is None):
+         # the first interval fully after the ramp, fio restarts its counters then
+         guards['grace'] = run['rows'][0]['params'].get('ramp_time', 0) + args.CfgInterval;
+   run_name = os.path.basename(json_file)[:-len(".json")];
+   ts_rows  = [ "Time_s,Read_IOPS,Write_IOPS,Read_BW,Write_BW,Read_Clat_us,Write_Clat_us\n" ];
+   try:
+      proc  = subprocess.Popen([ "fio", run['file'], "--output-format=json", "--status-interval=%d" % (args.CfgInterval) ], env=env, stdout=subprocess.PIPE);
+   except OSError, exc:
+      print "ERR: cannot start fio for %s: %s" % (run_name, exc);
+      return 127;
+   # IntervalReport - print and record the rates of an interval report and check it
+   #                  against the guard rails; returns its totals for the next interval.
+   def IntervalReport(report, seconds, prev):
+      totals = IntervalTotals(report, seconds);
+      if ((totals[1] < prev[1]) or (totals[2] < prev[2])):
+         # fio restarts its counters when ramp_time ends, count from the end of the ramp
+         ramp = run['rows'][0]['params'].get('ramp_time', 0);
+         prev = IntervalTotals({ "jobs": [] }, min(max(prev[0], ramp), totals[0]));
+      period = max(totals[0] - prev[0], 0.001);
+      rates  = [ (totals[index] - prev[index]) / period for index in range(1, 5) ];
+      clat   = [ 0.0, 0.0 ];
+      for index in range(2):
+         if (totals[1 + index] > prev[1 + index]):
+            clat[index] = (totals[5 + index] - prev[5 + index]) / (totals[1 + index] - prev[1 + index]);
+      print "  %s %6.0fs  read %8.0f iops %9.0f KiB/s %8.1f us  write %8.0f iops %9.0f KiB/s %8.1f us" % (run_name, totals[0], rates[0], rates[2], clat[0], rates[1], rates[3], clat[1]);
+      sys.stdout.flush();
+      ts_rows.append("%.1f,%.0f,%.0f,%.0f,%.0f,%.1f,%.1f\n" % (totals[0], rates[0], rates[1], rates[2], rates[3], clat[0], clat[1]));
+      if ((guards is not None) and (not aborted.has_key(run_name))):
+         reason = CheckGuards(guards, report, rates[0] + rates[1], totals[0]);
+         if (reason is not None):
+            print "GUARD: stopping %s, %s" % (run_name, reason);
+            aborted[run_name] = [ reason, guards['abort'] ];
+            # fio finishes its jobs on SIGTERM and still prints the final report
+            proc.terminate();
+      return totals;
+
+   prev     = IntervalTotals({ "jobs": [] }, 0.0);
+   pending  = None;
+   start    = None;
+   report   = None;
+   text     = "";
+   for line in iter(proc.stdout.readline, ""):
+      text += line;
+      # each report is a pretty printed object ending in a "}" line, any fio messages
+      # printed before it are dropped
+      if ((line.rstrip() != "}") or ("{" not in text)):
+         continue;
+      try:
+         report = json.loads(text[text.index("{"):]);
+      except ValueError:
+         continue;
+      text   = "";
+      # the last report is fio's final output, not an interval: a report is taken as an
+      # interval once the next one arrives
+      if (start is None):
+         # fio's clock when the jobs started
+         start = ReportTime(report);
+         if (report.has_key("timestamp_ms")):
+            start -= max([ 0 ] + [ job.get("elapsed", 0) for job in report["jobs"] ]);
+      if (pending is not None):
+         prev = IntervalReport(pending, ReportTime(pending) - start, prev);
+      pending = report;
+   exit_code = proc.wait();
+   ts_file = open("%s/%s.ts.csv" % (os.path.dirname(json_file), run_name), "w");
+   ts_file.write("".join(ts_rows));
+   ts_file.close();
+   if (report is not None):
+      out_file = open(json_file, "w");
+      json.dump(report, out_file);
+      out_file.close();
+   return exit_code;
+
+def LoadJson(json_file):
+   in_file = open(json_file, 'r');
+   j_data  = json.load(in_file);
+   in_file.close();
+   return j_data;
+
+# GetClatUsec - completion latency in usec from a fio read/write object, the 99th
+#               percentile when fio reports percentiles (unless mean is set), the mean
+#               otherwise.
+def GetClatUsec(io_data, mean=False):
+   if (io_data.has_key("clat_ns")):
+      clat, scale = io_data["clat_ns"], 1000.0;
+   elif (io_data.has_key("clat")):
+      clat, scale = io_data["clat"], 1.0;
+   else:
+      return 0.0;
+   if ((not mean) and clat.get("percentile", {}).has_key("99.000000")):
+      return clat["percentile"]["99.000000"] / scale;
+   return clat.get("mean", 0.0) / scale;
+
+# SummaryRows - one csv row per reporting group; a fused sweep reports one group per
+#               sweep point, in job file order, a plain workload reports a single group.
+#               row_names overrides the plan row names, e.g. for knee search points.
+def SummaryRows(j_data, rows, json_file, row_names=None):
+   if (row_names is None):
+      row_names = [ row['name'] for row in rows ];
+   csv_rows  = "";
+   group_ids = [];
+   for job in j_data["jobs"]:
+      if (job["groupid"] in group_ids):
+         continue;
+      group_ids.append(job["groupid"]);
+      if (len(group_ids) > len(rows)):
+         print "WARNING: unexpected reporting group %s in %s" % (job["groupid"], json_file);
+         break;
+
+      # Grab data and save it to output file
+      row      = rows[len(group_ids) - 1];
+      row_name = row_names[len(group_ids) - 1];
+      rd_bw    = job["read"]["bw"];
+      rd_iops  = job["read"]["iops"];
+      wr_bw    = job["write"]["bw"];
+      wr_iops  = job["write"]["iops"];
+      # Steady state outcome and when the job ended, blank when not requested
+      ss_attained = "";
+      if (job.has_key("steadystate")):
+         ss_attained = [ "no", "yes" ][int(job["steadystate"].get("attained", 0)) != 0];
+      elapsed  = job.get("elapsed", "");
+      guard    = aborted.get(os.path.basename(json_file)[:-len(".json")], [ "" ])[0];
+      csv_rows += "%s,%s,%s,%s,%s,%s,%s,%s,%s\n" % (row_name, rd_bw, rd_iops, wr_bw, wr_iops, ss_attained, elapsed, guard, ",".join(row['labels']));
+      results[row_name] = [ rd_bw + wr_bw, rd_iops + wr_iops ];
+      if (row.has_key('scale')):
+         scale_list[row_name] = row['scale'];
+   return csv_rows;
+
+# ScalingRows - per device throughput of each device scaling series; efficiency is the
+#               per device IOPS relative to the smallest device count of the series.
+def ScalingRows():
+   csv_rows = "";
+   series   = {};
+   for row_name, [ base_name, num_devices ] in scale_list.iteritems():
+      if (results.has_key(row_name)):
+         series.setdefault(base_name, []).append([ num_devices, results[row_name] ]);
+   for base_name in sorted(series.keys()):
+      points   = sorted(series[base_name]);
+      base_dev = float(points[0][1][1]) / points[0][0];
+      for [ num_devices, [ bw, iops ] ] in points:
+         efficiency = 0.0;
+         if (base_dev > 0):
+            efficiency = 100.0 * (float(iops) / num_devices) / base_dev;
+         csv_rows += "%s,%d,%s,%s,%.1f,%.1f,%.1f\n" % (base_name, num_devices, bw, iops, float(bw) / num_devices, float(iops) / num_devices, efficiency);
+   return csv_rows;
+
+# KneeSearch - find the saturation knee of a knee_search workload.  The searched option
+#              is doubled from its minimum until IOPS gain less than gain_pct, latency
+#              passes sla_usec or the maximum is reached.  A value is saturated when it is
+#              over the SLA or within gain_pct of peak IOPS; the bracket between the last
+#              unsaturated and first saturated value is bisected until it is narrower than
+#              resolution_pct, and the knee is the smallest saturated value within the SLA.
+#              A failed fio point ends the search with the points measured so far.
+#              Returns [ summary rows, knee row, [ exit code, reason ] of a failed point
+#              or None ].
+def KneeSearch(run):
+   fio_item = run['id'];
+   knee     = run['knee'];
+   measured = {};
+   csv_rows = "";
+   failure  = [];
+   def Measure(value):
+      row_name  = "%s_%d%s" % (fio_item, value, knee['tag']);
+      json_file = "%s/%s.json" % (out_folder, row_name);
+      [ exit_code, j_data ] = RunFio(run, json_file, { knee['variable']: str(value) });
+      if (j_data is None):
+         print "ERR: fio failed (exit %d) on %s; ending the knee search, continuing with the next run." % (exit_code, row_name);
+         failure.extend([ exit_code, "fio failed (exit %d) at %s=%d" % (exit_code, knee['option'], value) ]);
+         return "";
+      iops, clat_sum = 0.0, 0.0;
+      for job in j_data["jobs"]:
+         for io_dir in [ "read", "write" ]:
+            iops     += job[io_dir]["iops"];
+            clat_sum += job[io_dir]["iops"] * GetClatUsec(job[io_dir]);
+      clat = 0.0;
+      if (iops > 0):
+         clat = clat_sum / iops;
+      print "  %s: %s=%d iops=%.0f clat=%.1fus" % (fio_item, knee['option'], value, iops, clat);
+      measured[value] = [ iops, clat ];
+      return SummaryRows(j_data, run['rows'], json_file, [ row_name ]);
+   def OverSla(value):
+      return ((knee['sla_usec'] > 0) and (measured[value][1] > knee['sla_usec']));
+   def Saturated(value, peak):
+      return (OverSla(value) or (measured[value][0] >= peak * (1.0 - gain)));
+
+   gain  = knee['gain_pct'] / 100.0;
+   prev  = None;
+   value = knee['min'];
+   while (value <= knee['max']):
+      csv_rows += Measure(value);
+      if ((len(failure) > 0) or OverSla(value) or ((prev is not None) and (measured[value][0] < measured[prev][0] * (1.0 + gain)))):
+         break;
+      prev   = value;
+      value *= 2;
+   if (len(measured) == 0):
+      print "WARNING: no point of %s was measured, no knee found." % (fio_item);
+      return [ csv_rows, "%s,%s,,,,0\n" % (fio_item, knee['option']), failure or None ];
+   peak = max([ item[0] for item in measured.values() ]);
+   lo   = max([ None ] + [ item for item in measured.keys() if (not Saturated(item, peak)) ]);
+   hi   = min([ item for item in measured.keys() if Saturated(item, peak) ]);
+   if ((lo is not None) and (len(failure) == 0)):
+      while ((hi - lo > 1) and (hi > lo * (1.0 + knee['resolution_pct'] / 100.0))):
+         mid = (lo + hi) / 2;
+         csv_rows += Measure(mid);
+         if (len(failure) > 0):
+            break;
+         peak = max(peak, measured[mid][0]);
+         if (Saturated(mid, peak)):
+            hi = mid;
+         else:
+            lo = mid;
+   knee_value = hi;
+   if (OverSla(knee_value)):
+      knee_value = lo;
+   if (knee_value is None):
+      print "WARNING: %s violates the latency SLA at %s=%d" % (fio_item, knee['option'], knee['min']);
+      knee_row = "%s,%s,,,,%d\n" % (fio_item, knee['option'], len(measured));
+   else:
+      print "Knee for %s: %s=%d (%d runs%s)" % (fio_item, knee['option'], knee_value, len(measured), [ "", ", search ended early" ][len(failure) > 0]);
+      knee_row = "%s,%s,%d,%.0f,%.1f,%d\n" % (fio_item, knee['option'], knee_value, measured[knee_value][0], measured[knee_value][1], len(measured));
+   return [ csv_rows, knee_row, failure or None ];
+
+# RepeatStats - [ mean, sample standard deviation, 95% confidence interval half width ] of
+#               repeated measurements; the interval is None for a single measurement.
+def RepeatStats(values):
+   mean = sum(values) / float(len(values));
+   if (len(values) < 2):
+      return [ mean, 0.0, None ];
+   stddev = math.sqrt(sum([ (value - mean) ** 2 for value in values ]) / (len(values) - 1));
+   t_95   = 1.96;
+   if (len(values) - 1 <= len(T_95)):
+      t_95 = T_95[len(values) - 2];
+   return [ mean, stddev, t_95 * stddev / math.sqrt(len(values)) ];
+
+# RepeatSamples - [ [ bw, ... ], [ iops, ... ] ] (read plus write) of each reporting group,
+#                 one value per repeat of a run.
+def RepeatSamples(json_files):
+   samples = [];
+   for json_file in json_files:
+      group_ids = [];
+      for job in LoadJson(json_file)["jobs"]:
+         if (job["groupid"] in group_ids):
+            continue;
+         group_ids.append(job["groupid"]);
+         if (len(samples) < len(group_ids)):
+            samples.append([ [], [] ]);
+         samples[len(group_ids) - 1][0].append(job["read"]["bw"] + job["write"]["bw"]);
+         samples[len(group_ids) - 1][1].append(job["read"]["iops"] + job["write"]["iops"]);
+   return samples;
+
+# RepeatWidth - widest 95% confidence interval half width of a run's repeats, in percent
+#               of the mean, over the bandwidth and IOPS of all its reporting groups; None
+#               until there are two repeats.
+def RepeatWidth(samples):
+   width = 0.0;
+   for group in samples:
+      for values in group:
+         [ mean, stddev, ci ] = RepeatStats(values);
+         if (ci is None):
+            return None;
+         if (mean > 0):
+            width = max(width, 100.0 * ci / mean);
+   return width;
+
+# RepeatRun - run a workload again, into <run>.r<n>.json, until the confidence interval
+#             of its results is within -r percent (RepeatWidth), at least --repeat-min and
+#             at most --repeat-max runs in all.  A failed or guard stopped repeat ends the
+#             repetition, it is not counted.  Returns the json output of every run kept,
+#             the first one included.
+def RepeatRun(run, json_file):
+   json_files = [ json_file ];
+   while (len(json_files) < args.CfgRepeatMax):
+      width = RepeatWidth(RepeatSamples(json_files));
+      if ((len(json_files) >= args.CfgRepeatMin) and (width is not None) and (width <= args.CfgRepeatCi)):
+         break;
+      rep_file = "%s.r%d.json" % (json_file[:-len(".json")], len(json_files) + 1);
+      [ exit_code, j_data ] = RunFio(run, rep_file);
+      if ((j_data is None) or aborted.has_key(os.path.basename(rep_file)[:-len(".json")])):
+         print "WARNING: repeat %s failed or was stopped; keeping %d run(s) of %s." % (rep_file, len(json_files), run['id']);
+         break;
+      json_files.append(rep_file);
+   print "Repeated %s %d times, 95%% confidence interval +-%.1f%%" % (run['id'], len(json_files), RepeatWidth(RepeatSamples(json_files)) or 0.0);
+   return json_files;
+
+# RepeatRows - one csv row per reporting group of a repeated run with the mean, standard
+#              deviation and 95% confidence interval (half width) of its IOPS and
+#              bandwidth.  The means replace the first run's results for scaling.csv.
+def RepeatRows(run, json_files):
+   csv_rows = "";
+   for row, [ bw_list, iops_list ] in zip(run['rows'], RepeatSamples(json_files)):
+      bw_stats   = RepeatStats(bw_list);
+      iops_stats = RepeatStats(iops_list);
+      ci_pct     = [];
+      for [ mean, stddev, ci ] in [ iops_stats, bw_stats ]:
+         if ((ci is not None) and (mean > 0)):
+            ci_pct.append(100.0 * ci / mean);
+      values = [ "" if (item is None) else "%.1f" % (item) for item in iops_stats + bw_stats ];
+      csv_rows += "%s,%d,%s,%s\n" % (row['name'], len(json_files), ",".join(values), "" if (len(ci_pct) == 0) else "%.1f" % (max(ci_pct)));
+      results[row['name']] = [ bw_stats[0], iops_stats[0] ];
+   return csv_rows;
+
+# AddHistory - append how long a run took, and its write bandwidth (KiB/s, all targets),
+#              to the results history.
+def AddHistory(run, elapsed, j_data=None):
+   write_bw = "";
+   if (j_data is not None):
+      write_bw = sum([ job["write"]["bw"] for job in j_data["jobs"] ]);
+   new_file = (not os.path.exists(CFG_HISTORY_FILE));
+   out_file = open(CFG_HISTORY_FILE, "a");
+   if (new_file):
+      out_file.write("Date,Fingerprint,Run,Item,Num_Targets,Elapsed_s,Write_BW\n");
+   out_file.write("%s,%s,%s,%s,%d,%.0f,%s\n" % (time.strftime("%Y-%m-%d %H:%M:%S"), run['fingerprint'], run['id'], run['item'], len(run['targets']), elapsed, write_bw));
+   out_file.close();
+
+# AddJournal - append an entry to the journal and force it to disk before going on, so a
+#              crash loses at most the run in progress.
+def AddJournal(entry):
+   out_file = open(CFG_JOURNAL_FILE, "a");
+   out_file.write("%s\n" % (json.dumps(entry, sort_keys=True)));
+   out_file.flush();
+   os.fsync(out_file.fileno());
+   out_file.close();
+
+# LoadJournal - [ header, entries ] of the journal, entries by position in the run list:
+#               the last entry of each position, i.e. "started" for the interrupted run.
+def LoadJournal(run_list):
+   if (not os.path.exists(CFG_JOURNAL_FILE)):
+      print "WARNING: no journal %s to resume from; starting from the top." % (CFG_JOURNAL_FILE);
+      return [ None, None ];
+   journal = {};
+   in_file = open(CFG_JOURNAL_FILE, 'r');
+   try:
+      header = json.loads(in_file.readline());
+   except ValueError:
+      # the header is written before the first run starts, nothing ran yet
+      in_file.close();
+      print "WARNING: journal %s has no readable header; starting from the top." % (CFG_JOURNAL_FILE);
+      return [ None, None ];
+   for line in in_file:
+      try:
+         entry = json.loads(line);
+      except ValueError:
+         # the tail of an entry being written when the system went down
+         continue;
+      journal[entry['index']] = entry;
+   in_file.close();
+   if (header.get('runs') != [ run['id'] for run in run_list ]):
+      print "ERR: journal %s was written for a different run list (-s %s); run without --resume." % (CFG_JOURNAL_FILE, header.get('sequence') or "<all>");
+      raise SystemExit(1);
+   return [ header, journal ];
+
+# GroupDevices - devices used by the runs of a target group folder's plan.
+def GroupDevices(group_name):
+   plan    = LoadPlan("%s/%s" % (group_name, CFG_DEF_PLAN_FILE));
+   devices = set(plan['targets']);
+   for run in plan['runs']:
+      devices.update(run['targets']);
+   return devices;
+
+# ScheduleGroups - execute target group folders, each by its own fio-exec.py with the
+#                  same -s/--resume options.  A group starts once none of its devices is
+#                  locked by a running group (and, when isolated, no group is running);
+#                  groups are tried in the order given, and a ready group may start
+#                  ahead of an earlier one still waiting for its devices.  Writes
+#                  schedule.csv.
+def ScheduleGroups(args):
+   if (args.CfgGroups == "all"):
+      groups = sorted([ os.path.dirname(plan_file) for plan_file in glob.glob("*/%s" % (CFG_DEF_PLAN_FILE)) ]);
+   else:
+      groups = args.CfgGroups.split(',');
+   if (len(groups) == 0):
+      print "ERR: no target group folders with a %s found." % (CFG_DEF_PLAN_FILE);
+      raise SystemExit(1);
+   devices   = dict([ [ group_name, GroupDevices(group_name) ] for group_name in groups ]);
+   exec_args = [];
+   if (args.CfgSequence is not None):
+      exec_args += [ "-s", args.CfgSequence ];
+   if (args.CfgResume):
+      exec_args.append("--resume");
+   if (args.CfgRefill):
+      exec_args.append("--reprecondition");
+   exec_args += [ "-i", str(args.CfgInterval) ];
+   if (args.CfgRepeatCi > 0):
+      exec_args += [ "-r", str(args.CfgRepeatCi), "--repeat-min", str(args.CfgRepeatMin), "--repeat-max", str(args.CfgRepeatMax) ];
+   pending  = list(groups);
+   running  = {};
+   locks    = {};
+   finished = [];
+   while ((len(pending) > 0) or (len(running) > 0)):
+      for group_name in list(pending):
+         if ((args.CfgMode == "isolate") and (len(running) > 0)):
+            break;
+         if (True in [ locks.has_key(device) for device in devices[group_name] ]):
+            continue;
+         for device in devices[group_name]:
+            locks[device] = group_name;
+         log_file = open("%s/%s" % (group_name, CFG_GROUP_LOG), "w");
+         proc     = subprocess.Popen([ sys.executable, "fio-exec.py" ] + exec_args, cwd=group_name, stdout=log_file, stderr=subprocess.STDOUT);
+         running[group_name] = [ proc, log_file, time.time(), set(running.keys()) ];
+         for other in running[group_name][3]:
+            running[other][3].add(group_name);
+         pending.remove(group_name);
+         print "Started target group %s on %s (%d running)" % (group_name, ",".join(sorted(devices[group_name])), len(running));
+      time.sleep(1);
+      for group_name in running.keys():
+         [ proc, log_file, start, overlap ] = running[group_name];
+         if (proc.poll() is None):
+            continue;
+         log_file.close();
+         for device in devices[group_name]:
+            del locks[device];
+         del running[group_name];
+         finished.append([ group_name, start, time.time(), proc.returncode, overlap ]);
+         print "Finished target group %s, exit %d, after %.0fs; output in %s/%s" % (group_name, proc.returncode, time.time() - start, group_name, CFG_GROUP_LOG);
+   sched_str = "Group,Devices,Start,End,Elapsed_s,Exit,Concurrent_With\n";
+   for [ group_name, start, end, exit_code, overlap ] in finished:
+      sched_str += "%s,%s,%s,%s,%.0f,%d,%s\n" % (group_name, " ".join(sorted(devices[group_name])), time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)),
+                                                 time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end)), end - start, exit_code, " ".join(sorted(overlap)));
+   WriteCsv("schedule.csv", sched_str, "target group schedule");
+   failed = [ item[0] for item in finished if (item[3] != 0) ];
+   if (len(failed) > 0):
+      print "ERR: target group(s) %s failed." % (",".join(failed));
+      raise SystemExit(1);
+
+def WriteCsv(out_file_name, csv_str, title):
+   print "Saving %s to CSV: %s" % (title, out_file_name);
+   print csv_str;
+   csv_file = open(out_file_name, "w");
+   csv_file.write(csv_str);
+   csv_file.close();
+   SyncFiles([ out_file_name ]);
+
+#############################################
+
+args       = GetArgs();
+if ((args.CfgRepeatCi > 0) and ((args.CfgRepeatMin < 2) or (args.CfgRepeatMax < args.CfgRepeatMin))):
+   print "ERR: -r needs --repeat-min of 2 or more and --repeat-max of at least --repeat-min.";
+   raise SystemExit(1);
+if (args.CfgGroups is not None):
+   ScheduleGroups(args);
+   raise SystemExit(0);
+plan       = LoadPlan(args.CfgPlanFile);
+VerifyPlan(plan);
+[ run_list, seq_list ] = SelectRuns(plan, args.CfgSequence);
+results    = {};
+scale_list = {};
+aborted    = {};
+compress_queue = [];
+compress_proc  = None;
+
+[ header, journal ] = [ None, None ];
+if (args.CfgResume):
+   [ header, journal ] = LoadJournal(run_list);
+if (journal is None):
+   # Execute each script with output matching the input name with .json
+   out_folder = NewRunFolder(plan['out_folder']);
+   if (os.path.exists(CFG_JOURNAL_FILE)):
+      os.remove(CFG_JOURNAL_FILE);
+   AddJournal({ 'status': "begin", 'sequence': args.CfgSequence, 'runs': [ run['id'] for run in run_list ], 'start': time.time(), 'out_folder': out_folder });
+   journal = {};
+else:
+   # journals written before run directories used the output folder itself
+   out_folder = header.get('out_folder', plan['out_folder']);
+   print "Resuming: %d of %d runs completed in %s." % (len([ entry for entry in journal.values() if (entry['status'] != "started") ]), len(run_list), out_folder);
+print "Output folder: %s" % (out_folder);
+
+# During execution we will parse each json output file for iops, bw and latency averages
+csv_str  = "Workload,Read_BW,Read_IOPS,Write_BW,Write_IOPS,SS_Attained,Elapsed_s,Guard,%s\n" % (",".join(plan['label_columns']));
+knee_str = "Workload,Option,Knee,IOPS,Clat_us,Runs\n";
+rep_str  = "Workload,Repeats,IOPS_Mean,IOPS_Stddev,IOPS_CI95,BW_Mean,BW_Stddev,BW_CI95,CI95_Pct\n";
+num_knee  = 0;
+num_writes = 0;
+executed  = {};
+dev_state = "initial";
+filled    = set();
+seq_abort = {};
+if ((args.CfgInterval <= 0) and (True in [ run.has_key('guards') for run in run_list ])):
+   print "WARNING: guard rails need fio status reports; they are not checked with -i 0.";
+for index, run in enumerate(run_list):
+   done = journal.get(index);
+   if ((done is not None) and (done['status'] == "started")):
+      print "Restarting %s, interrupted at %s" % (run['id'], time.ctime(done['start']));
+      if (args.CfgRefill and (run['effect'] != "read") and filled.issuperset(run['targets'])):
+         fill_runs = [ item for item in run_list[:index] if ((item['effect'] == "fill") and set(item['targets']).issuperset(run['targets'])) ];
+         if (len(fill_runs) > 0):
+            print "Refilling targets with %s before restarting %s" % (fill_runs[-1]['id'], run['id']);
+            RunFio(fill_runs[-1], "%s/%s-refill.json" % (out_folder, fill_runs[-1]['id']));
+      done = None;
+   if ((done is not None) and done.has_key('output') and (not os.path.exists(done['output']))):
+      print "Restarting %s, its output %s is missing" % (run['id'], done['output']);
+      done = None;
+   entry = { 'index': index, 'run': run['id'], 'start': time.time() };
+   if (seq_abort.has_key(seq_list[index])):
+      print "Skipping %s, its sequence was aborted: %s" % (run['id'], seq_abort[seq_list[index]]);
+      if (done is None):
+         entry.update({ 'status': "skipped", 'guard': seq_abort[seq_list[index]], 'end': time.time() });
+         AddJournal(entry);
+      continue;
+   if ((run['effect'] == "fill") and filled.issuperset(run['targets'])):
+      if (done is None):
+         print "Skipping fill %s, targets are still preconditioned" % (run['id']);
+         entry.update({ 'status': "skipped", 'end': time.time() });
+         AddJournal(entry);
+      continue;
+   # a run listed again, e.g. by two sequences, keeps the output of each execution
+   run_name = run['id'];
+   if (run['id'] in [ item['id'] for item in run_list[:index] ]):
+      run_name = "%s.%d" % (run['id'], index);
+   json_file = "%s/%s.json" % (out_folder, run_name);
+   # identical work already done in this device state: share its result.
+   run_key = (run['fingerprint'], dev_state);
+   if (executed.has_key(run_key)):
+      [ first_id, first_json, knee_row ] = executed[run_key];
+      if (done is None):
+         entry.update({ 'status': "reused", 'end': time.time() });
+         AddJournal(entry);
+      if (first_id == run['id']):
+         print "Skipping %s, already executed in device state %s" % (run['id'], dev_state);
+         continue;
+      print "Reusing result of %s for %s" % (first_id, run['id']);
+      if (run.has_key('knee')):
+         knee_str += run['id'] + knee_row[len(first_id):];
+         num_knee += 1;
+         continue;
+      shutil.copy(first_json[0], json_file);
+      csv_str  += SummaryRows(LoadJson(json_file), run['rows'], json_file);
+      if ((args.CfgRepeatCi > 0) and (run['effect'] != "fill")):
+         rep_str += RepeatRows(run, first_json);
+      continue;
+   if (run.has_key('knee')):
+      if (done is None):
+         AddJournal(dict(entry, status="started"));
+         [ csv_rows, knee_row, failure ] = KneeSearch(run);
+         entry.update({ 'status': "done", 'exit': 0, 'output': out_folder, 'end': time.time(), 'csv_rows': csv_rows, 'knee_row': knee_row });
+         if (failure is not None):
+            # the points measured before the failure are kept
+            entry.update({ 'status': "failed", 'exit': failure[0], 'guard': failure[1], 'abort': "run" });
+         else:
+            AddHistory(run, time.time() - entry['start']);
+         AddJournal(entry);
+      else:
+         entry = done;
+         [ csv_rows, knee_row ] = [ done['csv_rows'], done['knee_row'] ];
+         for json_file in glob.glob("%s/%s_*%s.json" % (out_folder, run['id'], run['knee']['tag'])):
+            SummaryRows(LoadJson(json_file), run['rows'], json_file, [ os.path.basename(json_file)[:-len(".json")] ]);
+      if (entry['status'] == "failed"):
+         aborted[run['id']] = [ entry['guard'], entry['abort'] ];
+      csv_str  += csv_rows;
+      knee_str += knee_row;
+      num_knee += 1;
+      if (not aborted.has_key(run['id'])):
+         executed[run_key] = [ run['id'], None, knee_row ];
+   else:
+      if (done is None):
+         AddJournal(dict(entry, status="started"));
+         [ exit_code, j_data ] = RunFio(run, json_file);
+         json_files = [ json_file ];
+         if ((args.CfgRepeatCi > 0) and (j_data is not None) and (not aborted.has_key(run_name)) and (run['effect'] != "fill")):
+            json_files = RepeatRun(run, json_file);
+         entry.update({ 'status': [ "failed", "done" ][j_data is not None], 'exit': exit_code, 'output': json_file, 'repeats': json_files, 'end': time.time() });
+         if (aborted.has_key(run_name)):
+            # fio exits non zero when stopped, its final report is still valid
+            [ entry['guard'], entry['abort'] ] = aborted[run_name];
+            entry['status'] = "aborted";
+            if ((j_data is None) and os.path.exists(json_file)):
+               j_data = LoadJson(json_file);
+         AddJournal(entry);
+         if (j_data is None):
+            print "ERR: fio failed (exit %d) on %s; continuing with the next run." % (exit_code, run['id']);
+         else:
+            AddHistory(run, (entry['end'] - entry['start']) / len(json_files), j_data);
+      elif (done['status'] != "failed"):
+         json_file  = done.get('output', json_file);
+         j_data     = LoadJson(json_file);
+         json_files = done.get('repeats', [ json_file ]);
+         if (done['status'] == "aborted"):
+            aborted[run_name] = [ done['guard'], done['abort'] ];
+      else:
+         j_data = None;
+      if (j_data is None):
+         # a failed write leaves the targets in an unknown state
+         if (run['effect'] != "read"):
+            num_writes += 1;
+            dev_state   = "%s.%d" % (run['id'], num_writes);
+            filled.difference_update(run['targets']);
+         continue;
+      csv_str  += SummaryRows(j_data, run['rows'], json_file);
+      if ((args.CfgRepeatCi > 0) and (not aborted.has_key(run_name)) and (run['effect'] != "fill")):
+         rep_str += RepeatRows(run, json_files);
+      if (not aborted.has_key(run_name)):
+         executed[run_key] = [ run['id'], json_files, None ];
+      elif (aborted[run_name][1] == "sequence"):
+         seq_abort[seq_list[index]] = "%s on %s" % (aborted[run_name][0], run['id']);
+   # every write disturbs the state the runs after it measure
+   if (run['effect'] != "read"):
+      num_writes += 1;
+      dev_state   = "%s.%d" % (run['id'], num_writes);
+   if (run['effect'] == "fill"):
+      filled.update(run['targets']);
+   elif (run['effect'] == "rand_write"):
+      filled.difference_update(run['targets']);
+
+# Write JSON data to CSV file
+WriteCsv("%s/summary.csv" % (out_folder), csv_str, "output");
+if (len(scale_list) > 0):
+   scale_str = "Workload,Devices,BW,IOPS,BW_per_Device,IOPS_per_Device,Scaling_Efficiency\n" + ScalingRows();
+   WriteCsv("%s/scaling.csv" % (out_folder), scale_str, "device scaling results");
+if (num_knee > 0):
+   WriteCsv("%s/knee.csv" % (out_folder), knee_str, "knee search results");
+if (args.CfgRepeatCi > 0):
+   WriteCsv("%s/repeats.csv" % (out_folder), rep_str, "repeat statistics");
+CompressLogs(wait=True);
+print "IO characterization run complete.";
@@ -2,17 +2,21 @@
 
 import argparse
 import yaml
-import subprocess
 import os, sys
 import math
+import itertools
 import json
-import pprint
+import hashlib
+import copy
+import multiprocessing
+import StringIO
+import time
 sys.path.append('./libs/');
-from multihost import SvrMultiHostCustom
-
-sys.path.append('../provision/');
-from remote_exec import SvrRemoteThreadBase
+from fio_workload import FioWorkloadSpec, FusedFioScript, LABEL_COLUMNS, DEVICE_EFFECTS
 
+# NOTE: only the python standard library, PyYaml and libs/fio_workload.py are needed to
+#       generate scripts; remote execution libraries (paramiko) must only be imported
+#       where a remote feature is used.
 
 CFG_DEFAULT_WORKLOAD_YAML = """fio-gen:
    sequence:
@@ -98,214 +102,527 @@ CFG_DEFAULT_WORKLOAD_YAML = """fio-gen:
          run_time: "60"
 """;
 
-class FioWorkloadSpec:
-    'Container for storing and generating fio-r.py workload and job definition.'
-    def __init__(self, en_short, name, blk_sz, run_time, read_pct, io_type, io_depth, num_jobs, target_list=[]):
-        self.Name = name;
-        # Populate default values.
-        self.BlockSize   = blk_sz;
-        self.ReadPct     = int(read_pct);
-        self.IoDepth     = int(io_depth);
-        self.NumJobs     = int(num_jobs);
-        self.TargetList  = target_list;
-        self.NumTargets  = len(target_list);
-        self.EnLatency   = False;
-        self.EnIops      = False;
-        self.EnBandwidth = False;
-        self.GroupReport = True;
-        self.ReduceTOD   = False;
-        self.set_short_run(en_short);
-        self.set_io_type(io_type);
-        self.set_run_time(int(run_time));
-
-    def set_globals(group_reporting=True, reduce_tod=False):
-        self.GroupReport = group_reporting;
-        self.ReduceTOD   = reduce_tod;
-
-    def set_modifiers(self, en_lat = False, en_iops = False, en_bw = False):
-        self.EnLatency   = en_lat;
-        self.EnIops      = en_iops;
-        self.EnBandwidth = en_bw;
-        self.ReduceTOD   = False;
-
-    def set_short_run(self, en_short):
-        if (en_short):
-            print "WARNING: enabling SHORT run on workload %s" % (self.Name);
-            self.RunTime = 2;
-        self.EnShort = en_short;
-
-    def set_io_type(self, io_type):
-        io_type = io_type.lower();
-        if ((io_type == "random") or (io_type == "rand")):
-            io_type = "randrw";
-        elif ((io_type == "sequential") or (io_type == "seq")):
-            io_type = "readwrite";
-        else:
-            io_type = "*unknown*";
-        self.IoType = io_type;
-
-    def set_run_time(self, run_time):
-        # determine if we are to fill the drive, or not.
-        if (run_time == -1):
-            self.SizeBased  = True;
-        else:
-            self.SizeBased  = False;
-        # override runtime if this is a short run.
-        if (self.EnShort):
-            self.RunTime = 2;
-        else:
-            self.RunTime = int(run_time);
-
-    def get_name(self):
-        return self.Name;
-
-    def to_fio(self):
-        script_txt  = ("[global]\n"
-                       "thread\n"
-                       "direct=1\n"
-                       "norandommap=1\n"
-                       "refill_buffers\n"
-                       "ioengine=libaio\n");
-        if (not self.SizeBased):
-            script_txt += "time_based\n";
-
-        if (self.GroupReport):
-            script_txt  += "group_reporting\n"
-
-        if (self.ReduceTOD):
-            script_txt += "gtod_reduce=1\n";
-
-        if (self.EnLatency or self.EnIops or self.EnBandwidth):
-            if (self.EnLatency):
-                script_txt += "write_lat_log=%s\n" % (self.Name);
-            if (self.EnIops):
-                script_txt += "write_iops_log=%s\n" % (self.Name);
-            if (self.EnBandwidth):
-                script_txt += "write_bw_log=%s\n" % (self.Name);
-
-        script_txt += "runtime=%s\nbs=%s\nnumjobs=%s\niodepth=%s\n" % (self.RunTime, self.BlockSize, self.NumJobs, self.IoDepth);
-        script_txt += "rw=%s\nrwmixread=%s\n\n" % (self.IoType, self.ReadPct);
-
-        for target in self.TargetList:
-            script_txt += "[%s]\nfilename=%s\n\n" % (target.replace('/', '_'), target);
-        return script_txt;
-
-    def __str__(self):
-        script_txt   = "# AUTOGENERATED BY %s\n" % (__file__);
-        script_txt   = "# WORKLOAD NAME: %s\n" % (self.Name);
-        script_txt  += "BLOCK_SIZE: %s\n" % (self.BlockSize);
-        script_txt  += "RUN_TIME: %d\n" % (self.RunTime);
-        script_txt  += "READ_PCT: %d\n" % (self.ReadPct);
-        script_txt  += "IO_TYPE: %s\n" % (self.IoType);
-        script_txt  += "IO_DEPTH: %d\n" % (self.IoDepth);
-        script_txt  += "NUM_JOBS: %d\n" % (self.NumJobs);
-        script_txt  += "NUM_TARGETS: %d\n" % (self.NumTargets);
-        if (self.TargetList is not None):
-            if (len(self.TargetList) >= self.NumTargets):
-                script_txt += "TARGET_LIST: ";
-                last_index  = self.NumTargets - 1;
-                curr_index  = 0;
-                for target in self.TargetList:
-                    script_txt += "%s" % (target);
-                    if (curr_index != last_index):
-                        script_txt += ",";
-                    else:
-                        # There may be fewer targets in the list
-                        # than are requested for testing!
-                        break;
-                    curr_index += 1;
-                script_txt += "\n";
-            else:
-                print ("ERR: number of targets in target list exceeds targets specified.");
-                raise SystemExit(1);
-        flag_str     = "False";
-        if (self.SizeBased):
-            flag_str = "True";
-        script_txt  += "SIZE_BASED: %s\n" % (flag_str);
-        return script_txt;
+# Run plan written next to the job files, see GenerateFioScripts.
+CFG_PLAN_FILE = "fio-plan.json";
+# Content hashes of every generated file, see WriteFioScript.
+CFG_MANIFEST_FILE = "fio-manifest.json";
+# Results history appended by fio-exec.py, used to project run times, see EstimatePlan.
+CFG_HISTORY_FILE = "fio-history.csv";
+# Device limits probed from sysfs by serial/WWN, in the output folder, see ProbeTargets.
+CFG_PROBE_FILE = "fio-probe.json";
+
+# Options of the global section that a workload item may override.
+WORKLOAD_OPTIONS = [ 'group_reporting', 'reduce_tod', 'placement', 'cpus', 'numa_nodes', 'engine',
+                     'steady_state', 'ss_dur', 'ss_ramp', 'ramp_time',
+                     'log_lat', 'log_iops', 'log_bw', 'log_avg_msec', 'log_hist_msec', 'log_hist_coarseness',
+                     'log_max_value', 'log_compression', 'log_store_compressed',
+                     'guard_min_iops', 'guard_max_p99_usec', 'guard_max_errors', 'guard_abort', 'guard_grace' ];
 
 #############################################
 
-scr_heading = """#! /usr/bin/python
-import subprocess
-import json
-import argparse
-### autogenerated script using fio-gen.py
-out_folder = "json";
-# Input arguments
-def AddArgs(parser_obj):
-    parser_obj.add_argument('-s', dest='CfgSequence', action='store', required=False, default="max_baseline", help='Specify sequence to execute; max_baseline by default.');
-def GetArgs():
-    # create the top-level parser
-    parser = argparse.ArgumentParser(description='fio complex workload executor input arguments.');
-    AddArgs(parser);
-    # parse the args and call whatever function was selected
-    args = parser.parse_args();
-    return args;
-# List of scripts to execute, in order
-""";
+# WriteFioScript - write a generated file unless the same content is already on disk,
+#                  recording it in the manifest as added, updated or unchanged; returns
+#                  the sha1 of its content for the run plan.
+def WriteFioScript(file_name, script_txt, manifest, newline=True):
+   if (newline):
+      script_txt = "%s\n" % (script_txt);
+   sha1      = hashlib.sha1(script_txt).hexdigest();
+   base_name = os.path.basename(file_name);
+   manifest['files'][base_name] = sha1;
+   if (os.path.exists(file_name)):
+      # hash what is on disk, a file edited since the last generation is rewritten
+      in_file   = open(file_name, 'r');
+      disk_sha1 = hashlib.sha1(in_file.read()).hexdigest();
+      in_file.close();
+      if (disk_sha1 == sha1):
+         manifest['unchanged'].append(base_name);
+         return sha1;
+      manifest['updated'].append(base_name);
+   else:
+      manifest['added'].append(base_name);
+   out_file = open(file_name, 'w');
+   if (out_file is None):
+      print "ERR: failure opening workload file %s for writing." % (file_name);
+   else:
+      out_file.write(script_txt);
+      out_file.flush();
+      out_file.close();
+   print "  Workload written to %s" % (file_name);
+   return sha1;
 
-scr_footing = """
-# Execute each script with output matching the input name with .json
-subprocess.call("rm -rf %s ; sync ; mkdir %s" % (out_folder, out_folder), shell=True);
-# During execution we will parse each json output file for iops, bw and latency averages
-csv_str  = "Workload,Read_BW,Read_IOPS,Write_BW,Write_IOPS\\n";
-test_exec = name_list.sort();
-for fio_item in test_exec:
-   json_file = "%s/%s.json" % (out_folder, fio_item);
-   subprocess.call("fio %s.fio --output-format=json --output %s ; sync" % (fio_item, json_file), shell=True);
-   in_file   = open(json_file, 'r');
-   j_data    = json.load(in_file);
-   in_file.close();
+# LoadManifest - content hashes of the files written by the previous generation into
+#                the output folder, empty if there was none.
+def LoadManifest(out_folder):
+   manifest = { 'previous': {}, 'files': {}, 'added': [], 'updated': [], 'unchanged': [], 'removed': [] };
+   manifest_file = "%s/%s" % (out_folder, CFG_MANIFEST_FILE);
+   if (os.path.exists(manifest_file)):
+      in_file = open(manifest_file, 'r');
+      try:
+         manifest['previous'] = json.load(in_file).get('files', {});
+      except ValueError:
+         print "WARNING: ignoring unreadable manifest %s; files it listed may be left behind." % (manifest_file);
+      in_file.close();
+   return manifest;
 
-   # Grab data and save it to output file
-   rd_bw    = j_data["jobs"][0]["read"]["bw"];
-   rd_iops  = j_data["jobs"][0]["read"]["iops"];
-   wr_bw    = j_data["jobs"][0]["write"]["bw"];
-   wr_iops  = j_data["jobs"][0]["write"]["iops"];
-   csv_str += "%s,%s,%s,%s,%s\\n" % (fio_item, rd_bw, rd_iops, wr_bw, wr_iops);
-
-# Write JSON data to CSV file
-out_file_name = "%s/summary.csv" % (out_folder);
-print "Saving output to CSV: %s" % (out_file_name);
-print csv_str;
-csv_file = open(out_file_name, "w");
-csv_file.write(csv_str);
-csv_file.close();
-print "IO characterization run complete.";
-""";
+# SaveManifest - remove the files of the previous generation that were not generated this
+#                time, leaving any file the manifest does not list, save the new manifest
+#                and report what changed.
+def SaveManifest(out_folder, manifest):
+   for base_name in sorted(manifest['previous'].keys()):
+      if (manifest['files'].has_key(base_name) or (not os.path.exists("%s/%s" % (out_folder, base_name)))):
+         continue;
+      os.remove("%s/%s" % (out_folder, base_name));
+      manifest['removed'].append(base_name);
+   out_file = open("%s/%s" % (out_folder, CFG_MANIFEST_FILE), 'w');
+   json.dump({ 'files': manifest['files'] }, out_file, indent=1, sort_keys=True);
+   out_file.close();
+   print "Output folder %s: %d added, %d updated, %d unchanged, %d removed." % (out_folder, len(manifest['added']), len(manifest['updated']), len(manifest['unchanged']), len(manifest['removed']));
+   for change in [ 'added', 'updated', 'removed' ]:
+      for base_name in manifest[change]:
+         print "  %-8s %s" % (change, base_name);
+
+def PlanRow(workload, scale_list):
+   row = { 'name':   workload.Name,
+           'params': workload.get_plan_params(),
+           'labels': workload.get_labels() };
+   if (scale_list.has_key(workload.Name)):
+      row['scale'] = scale_list[workload.Name];
+   return row;
+
+# PlanFingerprint - canonical fingerprint of a run: the fingerprints of the workloads it
+#                   reports, in order, and the knee search settings and guard rails when
+#                   it has them.
+def PlanFingerprint(workloads, knee=None, guards=None):
+   fingerprint = ",".join([ workload.get_fingerprint() for workload in workloads ]);
+   if (knee is not None):
+      fingerprint += json.dumps(knee, sort_keys=True);
+   if (guards is not None):
+      fingerprint += json.dumps(guards, sort_keys=True);
+   return hashlib.sha1(fingerprint).hexdigest();
+
+# PlanDuplicates - report runs that repeat the work of an earlier run in the same device
+#                  state when the plan runs in order; fio-exec.py shares that result.
+def PlanDuplicates(runs):
+   run_index = dict([ [ run['id'], run ] for run in runs ]);
+   shared    = ExecutedRuns([ run['id'] for run in runs ], run_index)[1];
+   for [ run_id, first_id ] in shared:
+      print "  %s duplicates %s; the result will be shared." % (run_id, first_id);
+   return len(shared);
+
+# PlanSequences - resolve each sequence's workload items to the ids of the runs generated
+#                 for them, in sequence order.
+def PlanSequences(args, runs):
+   sequences = {};
+   for seq_name, seq_items in args.SequenceList.iteritems():
+      sequences[seq_name] = [];
+      for item in seq_items:
+         run_ids = [ run['id'] for run in runs if (run['item'] == item) ];
+         if (len(run_ids) == 0):
+            print "WARNING: sequence %s refers to unknown workload %s" % (seq_name, item);
+         sequences[seq_name].extend(run_ids);
+   if (args.CfgOrder):
+      for seq_name in sorted(sequences.keys()):
+         sequences[seq_name] = OrderSequence(seq_name, sequences[seq_name], runs);
+   return sequences;
+
+# RunEffect - device state effect of a run, the most disruptive of its workloads.
+def RunEffect(workloads):
+   effects = [ workload.get_device_effect() for workload in workloads ];
+   if ("fill" in effects):
+      return "fill";
+   return max(effects, key=DEVICE_EFFECTS.index);
 
-def GenerateFioScripts(args, workload_list):
-   exec_script = scr_heading;
-   name_list   = "\nname_list = { ";
+# OrderSequence - device state aware order of a sequence: one fill, then the read only
+#                 runs, the sequential writes and last the random writes, each group in
+#                 sequence order.  Reads never follow a random write, so the single fill
+#                 keeps every measurement valid; the fill is the sequence's own or the
+#                 first fill of the plan covering the targets of all its runs.
+def OrderSequence(seq_name, run_ids, runs):
+   run_index = dict([ [ run['id'], run ] for run in runs ]);
+   fill_ids  = [ run_id for run_id in run_ids if (run_index[run_id]['effect'] == "fill") ];
+   measure   = [ run_id for run_id in run_ids if (run_index[run_id]['effect'] != "fill") ];
+   if (len(measure) == 0):
+      return run_ids;
+   if (len(fill_ids) == 0):
+      targets  = set(sum([ run_index[run_id]['targets'] for run_id in measure ], []));
+      fill_ids = [ run['id'] for run in runs if ((run['effect'] == "fill") and set(run['targets']).issuperset(targets)) ];
+   if (len(fill_ids) == 0):
+      print "WARNING: no fill workload to precondition sequence %s; keeping its order." % (seq_name);
+      return run_ids;
+   num_fill = len([ run_id for run_id in run_ids if (run_id in fill_ids) ]);
+   ordered  = [ fill_ids[0] ];
+   for effect in DEVICE_EFFECTS:
+      ordered.extend([ run_id for run_id in measure if (run_index[run_id]['effect'] == effect) ]);
+   if (ordered != run_ids):
+      fill_str = "";
+      if (num_fill == 0):
+         fill_str = ", preconditioned by fill %s" % (fill_ids[0]);
+      elif (num_fill > 1):
+         fill_str = ", 1 fill instead of %d" % (num_fill);
+      print "  Sequence %s reordered by device state effect%s." % (seq_name, fill_str);
+   return ordered;
+
+# PlanTemplates - job template and environment of every workload of each template_list
+#                 sweep, by workload name.  Sweep points that render the same template
+#                 share one file, <sweep>.fio, or <sweep>-<n>.fio when the sweep needs
+#                 several (e.g. one per target count).
+def PlanTemplates(template_list):
+   templates = {};
+   for [ sweep_name, sweep_items ] in template_list:
+      families = [];
+      rendered = [ workload.to_template(sweep_name) for workload in sweep_items ];
+      for [ template_txt, env ] in rendered:
+         if (template_txt not in families):
+            families.append(template_txt);
+      for workload, [ template_txt, env ] in zip(sweep_items, rendered):
+         file_name = sweep_name;
+         if (len(families) > 1):
+            file_name = "%s-%d" % (sweep_name, families.index(template_txt) + 1);
+         templates[workload.Name] = [ "%s.fio" % (file_name), template_txt, env ];
+   return templates;
+
+# GenerateFioScripts - write the job files and the run plan (fio-plan.json) consumed by
+#                      fio-exec.py and fio-j2csv.py, and copy those scripts alongside.
+#                      Each run of the plan is one fio invocation: its job file and hash,
+#                      the workload item it came from, its targets, expected duration and
+#                      one row per reported workload with its parameters.  Only files
+#                      whose content changed are rewritten, see WriteFioScript.  Workloads
+#                      of a template_list sweep run a shared job template instead of a job
+#                      file of their own, with the run's 'env' filling in its parameters.
+def GenerateFioScripts(args, workload_list, fused_list=[], knee_list={}, scale_list={}, template_list=[]):
+   manifest    = LoadManifest(args.CfgOutFolder);
+   templates   = PlanTemplates(template_list);
+   written     = {};
+   runs        = [];
+   fused_names = {};
+   for [ sweep_name, sweep_items ] in fused_list:
+      for workload in sweep_items:
+         fused_names[workload.Name] = sweep_name;
    print "Generating fio scripts...";
    for workload in workload_list:
-      # Create workload input file
+      if (fused_names.has_key(workload.Name)):
+         continue;
+      # Create workload input file, or the template it shares with its sweep
       file_name = "%s/%s.fio" % (args.CfgOutFolder, workload.Name);
-      name_list += "'%s',\n" % (workload.Name);
-      out_file = open(file_name, 'w');
-      if (out_file is None):
-          print "ERR: failure opening workload file %s for writing." % (file_name);
-      else:
-         out_file.write("%s\n" % (workload.to_fio()));
-         out_file.flush();
-      print "  Workload written to %s" % (file_name);
-      out_file.close();
-   # complete the python fio-exec.py script and save to output folder.
-   name_list   += " };";
-   exec_script += "\n %s \n%s" % (name_list, scr_footing);
-   scr_file = open("%s/fio-exec.py" % (args.CfgOutFolder), 'w');
-   scr_file.write(exec_script);
-   scr_file.flush();
-   scr_file.close();
-   raise SystemExit(0);
+      script_txt = workload.to_fio();
+      if (templates.has_key(workload.Name)):
+         [ file_name, script_txt, env ] = templates[workload.Name];
+         file_name = "%s/%s" % (args.CfgOutFolder, file_name);
+      if (not written.has_key(file_name)):
+         written[file_name] = WriteFioScript(file_name, script_txt, manifest);
+      run = { 'id':         workload.Name,
+              'file':       os.path.basename(file_name),
+              'sha1':       written[file_name],
+              'item':       workload.Item,
+              'targets':    workload.TargetList,
+              'expected_s': workload.get_expected_time(),
+              'rows':       [ PlanRow(workload, scale_list) ] };
+      if (knee_list.has_key(workload.Name)):
+         run['knee']       = knee_list[workload.Name];
+         run['expected_s'] = None;
+      elif (workload.Guards is not None):
+         run['guards'] = workload.Guards;
+      if (templates.has_key(workload.Name)):
+         run['env'] = templates[workload.Name][2];
+      run['fingerprint'] = PlanFingerprint([ workload ], run.get('knee'), run.get('guards'));
+      run['effect']      = RunEffect([ workload ]);
+      runs.append(run);
+   for [ sweep_name, sweep_items ] in fused_list:
+      # Create one fused input file for the whole sweep
+      file_name = "%s/%s.fio" % (args.CfgOutFolder, sweep_name);
+      times     = [ workload.get_expected_time() for workload in sweep_items ];
+      run = { 'id':         sweep_name,
+              'file':       os.path.basename(file_name),
+              'sha1':       WriteFioScript(file_name, FusedFioScript(sweep_items), manifest),
+              'item':       sweep_items[0].Item,
+              'targets':    sweep_items[0].TargetList,
+              'expected_s': None if (None in times) else sum(times),
+              'rows':       [ PlanRow(workload, scale_list) for workload in sweep_items ] };
+      if (sweep_items[0].Guards is not None):
+         run['guards'] = sweep_items[0].Guards;
+      run['fingerprint'] = PlanFingerprint(sweep_items, None, run.get('guards'));
+      run['effect']      = RunEffect(sweep_items);
+      runs.append(run);
+   num_dup = PlanDuplicates(runs);
+   if (num_dup > 0):
+      print "%d of %d runs duplicate an earlier run." % (num_dup, len(runs));
+   plan = { 'generator':     os.path.basename(__file__),
+            'target_group':  args.CfgTargetSeq,
+            'targets':       args.TargetList,
+            'out_folder':    "json",
+            'label_columns': LABEL_COLUMNS,
+            'sequences':     PlanSequences(args, runs),
+            'runs':          runs };
+   EstimatePlan(args, plan);
+   plan_txt = json.dumps(plan, indent=1, sort_keys=True);
+   WriteFioScript("%s/%s" % (args.CfgOutFolder, CFG_PLAN_FILE), plan_txt, manifest);
+   # copy the executor and parser next to the job files so the folder is self contained.
+   script_dir = os.path.dirname(os.path.abspath(__file__));
+   for script in [ "fio-exec.py", "fio-j2csv.py" ]:
+      in_file = open("%s/%s" % (script_dir, script), 'r');
+      WriteFioScript("%s/%s" % (args.CfgOutFolder, script), in_file.read(), manifest, newline=False);
+      in_file.close();
+      os.chmod("%s/%s" % (args.CfgOutFolder, script), 0755);
+   SaveManifest(args.CfgOutFolder, manifest);
+
+#############################################
+
+# GetSizeValue - bytes of a size such as "4T", "800G" or "1048576".
+def GetSizeValue(size_str):
+   size_str = str(size_str).strip().upper().rstrip('B');
+   units    = { 'K': 1, 'M': 2, 'G': 3, 'T': 4, 'P': 5 };
+   if ((len(size_str) > 0) and units.has_key(size_str[-1])):
+      return int(float(size_str[:-1]) * (1024 ** units[size_str[-1]]));
+   return int(size_str);
+
+# GetDuration - seconds of a duration such as "3d", "72h", "90m" or "3600".
+def GetDuration(time_str):
+   time_str = str(time_str).strip().lower();
+   units    = { 's': 1, 'm': 60, 'h': 3600, 'd': 86400 };
+   if ((len(time_str) > 0) and units.has_key(time_str[-1])):
+      return float(time_str[:-1]) * units[time_str[-1]];
+   return float(time_str);
+
+def FormatDuration(seconds):
+   seconds = int(seconds);
+   if (seconds >= 86400):
+      return "%dd %02dh %02dm" % (seconds / 86400, (seconds % 86400) / 3600, (seconds % 3600) / 60);
+   return "%dh %02dm %02ds" % (seconds / 3600, (seconds % 3600) / 60, seconds % 60);
+
+# GetDeviceCapacity - bytes of a target; the capacity of its target group in the YAML,
+#                     otherwise its probe (-P) or what sysfs reports when generating on
+#                     the test host.
+def GetDeviceCapacity(target, args):
+   if (args.TargetCapacity.has_key(args.CfgTargetSeq)):
+      return args.TargetCapacity[args.CfgTargetSeq];
+   if ((args.DeviceLimits.get(target) or {}).get('capacity') is not None):
+      return args.DeviceLimits[target]['capacity'];
+   sys_file = "/sys/class/block/%s/size" % (os.path.basename(target));
+   if (os.path.exists(sys_file)):
+      in_file = open(sys_file, 'r');
+      sectors = int(in_file.read().strip());
+      in_file.close();
+      return sectors * 512;
+   return None;
+
+# LoadHistory - elapsed seconds of previous runs by fingerprint and per device write
+#               bandwidth (KiB/s) by workload item; the latest result wins.
+def LoadHistory(history_file):
+   history = { 'elapsed': {}, 'bw': {} };
+   if ((history_file is None) or (not os.path.exists(history_file))):
+      return history;
+   in_file = open(history_file, 'r');
+   columns = in_file.readline().strip().split(',');
+   for line in in_file:
+      row = dict(zip(columns, line.strip().split(',')));
+      if (row.get('Elapsed_s', "") != ""):
+         history['elapsed'][row['Fingerprint']] = float(row['Elapsed_s']);
+      if ((row.get('Write_BW', "") not in [ "", "0" ]) and (int(row['Num_Targets']) > 0)):
+         history['bw'][row['Item']] = float(row['Write_BW']) / int(row['Num_Targets']);
+   in_file.close();
+   print "Loaded run history from %s" % (history_file);
+   return history;
+
+# EstimateRun - projected seconds of a run, None when unknown.  A run measured before
+#               takes what it took; a timed run its run and ramp time; a fill the target
+#               capacity over the write bandwidth measured for its item; a knee search
+#               the doubling steps up to its maximum plus the bisection steps.
+def EstimateRun(run, history, args):
+   if (history['elapsed'].has_key(run['fingerprint'])):
+      return history['elapsed'][run['fingerprint']];
+   if (run.has_key('knee')):
+      knee   = run['knee'];
+      params = run['rows'][0]['params'];
+      steps  = int(math.log(float(knee['max']) / knee['min'], 2)) + 1;
+      steps += int(math.ceil(math.log(100.0 / knee['resolution_pct'], 2)));
+      return steps * (params['runtime'] + params['ramp_time']);
+   if (run['expected_s'] is not None):
+      return run['expected_s'];
+   capacity = [ GetDeviceCapacity(target, args) for target in run['targets'] ];
+   if ((None in capacity) or (not history['bw'].has_key(run['item']))):
+      return None;
+   return max(capacity) / (history['bw'][run['item']] * 1024.0);
+
+# ExecutedRuns - [ runs of run_ids fio-exec.py executes, [ run, run whose result it shares ]
+#                of the rest ], in order: a run identical to one already executed in the
+#                same device state reuses its result, and a fill is skipped while its
+#                targets are still preconditioned, until a random write runs on them.
+def ExecutedRuns(run_ids, run_index):
+   executed  = {};
+   filled    = set();
+   dev_state = 0;
+   run_list  = [];
+   shared    = [];
+   for run_id in run_ids:
+      run = run_index[run_id];
+      if ((run['effect'] == "fill") and filled.issuperset(run['targets'])):
+         continue;
+      if (executed.has_key((run['fingerprint'], dev_state))):
+         shared.append([ run_id, executed[(run['fingerprint'], dev_state)] ]);
+         continue;
+      executed[(run['fingerprint'], dev_state)] = run_id;
+      run_list.append(run_id);
+      # every write starts a new device state
+      if (run['effect'] != "read"):
+         dev_state += 1;
+      if (run['effect'] == "fill"):
+         filled.update(run['targets']);
+      elif (run['effect'] == "rand_write"):
+         filled.difference_update(run['targets']);
+   return [ run_list, shared ];
+
+# EstimatePlan - record the projected duration of each run in the plan and print the
+#                projected duration of each sequence and of the whole plan, counting
+#                only the runs that execute, warning about any over the time budget.
+def EstimatePlan(args, plan):
+   history = LoadHistory(args.CfgHistory);
+   run_index = {};
+   for run in plan['runs']:
+      run['estimate_s']     = EstimateRun(run, history, args);
+      run_index[run['id']] = run;
+   budget = None;
+   if (args.CfgBudget is not None):
+      budget = GetDuration(args.CfgBudget);
+   print "Projected duration for target group %s (%d targets):" % (plan['target_group'], len(plan['targets']));
+   totals = [ [ seq_name, plan['sequences'][seq_name] ] for seq_name in sorted(plan['sequences'].keys()) ];
+   totals.append([ "(all runs)", [ run['id'] for run in plan['runs'] ] ]);
+   for [ seq_name, run_ids ] in totals:
+      run_ids  = ExecutedRuns(run_ids, run_index)[0];
+      unknown  = [ run_id for run_id in run_ids if (run_index[run_id]['estimate_s'] is None) ];
+      seconds  = sum([ run_index[run_id]['estimate_s'] for run_id in run_ids if (run_id not in unknown) ]);
+      line     = "  %-16s %s" % (seq_name, FormatDuration(seconds));
+      if (len(unknown) > 0):
+         line += " + unknown for %s (no capacity or bandwidth history)" % (",".join(sorted(set(unknown), key=unknown.index)));
+      print line;
+      if ((budget is not None) and (seconds > budget)):
+         print "WARNING: %s of target group %s takes %s, over the time budget of %s." % (seq_name, plan['target_group'], FormatDuration(seconds), FormatDuration(budget));
+
+#############################################
+
+# ReadSysfs - stripped content of a sysfs attribute, None when it does not exist.
+def ReadSysfs(sys_file):
+   if (not os.path.exists(sys_file)):
+      return None;
+   in_file = open(sys_file, 'r');
+   value   = in_file.read().strip();
+   in_file.close();
+   return value;
+
+def GetSysfsInt(sys_file):
+   value = ReadSysfs(sys_file);
+   if ((value is None) or (not value.isdigit())):
+      return None;
+   return int(value);
+
+# GetSysfsDir - sysfs folder of a block device target, None when the target is not a
+#               block device of this host.
+def GetSysfsDir(target):
+   sys_dir = "/sys/class/block/%s" % (os.path.basename(os.path.realpath(target)));
+   if (not os.path.exists(sys_dir)):
+      return None;
+   return os.path.realpath(sys_dir);
+
+# GetDeviceId - WWN or serial number identifying the device of a target across runs and
+#               /dev renames; a partition is identified by its disk and partition number.
+def GetDeviceId(sys_dir):
+   suffix = "";
+   if (os.path.exists("%s/partition" % (sys_dir))):
+      suffix  = "-part%s" % (ReadSysfs("%s/partition" % (sys_dir)));
+      sys_dir = os.path.dirname(sys_dir);
+   for attribute in [ "wwid", "device/wwid", "serial", "device/serial" ]:
+      value = ReadSysfs("%s/%s" % (sys_dir, attribute));
+      if ((value is not None) and (value != "")):
+         return value + suffix;
+   return None;
+
+# ProbeDevice - limits of a block device read from sysfs: capacity (bytes), logical block
+#               size, request queue size (nr_requests) and largest request
+#               (max_hw_sectors_kb).  A partition uses the request queue of its disk.
+def ProbeDevice(sys_dir):
+   queue_dir = "%s/queue" % (sys_dir);
+   if (not os.path.exists(queue_dir)):
+      queue_dir = "%s/queue" % (os.path.dirname(sys_dir));
+   sectors   = GetSysfsInt("%s/size" % (sys_dir));
+   return { 'capacity':      None if (sectors is None) else sectors * 512,
+            'logical_block': GetSysfsInt("%s/logical_block_size" % (queue_dir)),
+            'nr_requests':   GetSysfsInt("%s/nr_requests" % (queue_dir)),
+            'max_hw_kb':     GetSysfsInt("%s/max_hw_sectors_kb" % (queue_dir)) };
+
+# ProbeTargets - device limits of each target, None when unknown.  Devices are probed
+#                once and cached in fio-probe.json of the output folder by WWN/serial
+#                (or by path when the device reports neither); --reprobe refreshes them.
+#                A target that is not a device of this host uses a cached probe with the
+#                same path, e.g. one generated on the test host.
+def ProbeTargets(args, target_list):
+   cache_file = "%s/%s" % (args.CfgOutFolder, CFG_PROBE_FILE);
+   cache      = { 'devices': {} };
+   if (os.path.exists(cache_file)):
+      in_file = open(cache_file, 'r');
+      cache   = json.load(in_file);
+      in_file.close();
+   limits = {};
+   for target in target_list:
+      sys_dir = GetSysfsDir(target);
+      if (sys_dir is None):
+         cached = [ item for item in cache['devices'].values() if (item['path'] == target) ];
+         limits[target] = None;
+         if (len(cached) > 0):
+            limits[target] = cached[0];
+         else:
+            print "WARNING: %s is not a block device of this host and has no cached probe; its workloads are not sized to it." % (target);
+         continue;
+      dev_id = GetDeviceId(sys_dir) or "path:%s" % (target);
+      if (args.CfgReprobe or (not cache['devices'].has_key(dev_id))):
+         cache['devices'][dev_id] = ProbeDevice(sys_dir);
+         cache['devices'][dev_id]['probed'] = time.strftime("%Y-%m-%d %H:%M:%S");
+         print "Probed %s (%s)" % (target, dev_id);
+      limits[target] = cache['devices'][dev_id];
+      limits[target]['path'] = target;
+      item = limits[target];
+      print "  %s: %s bytes, logical block %s, nr_requests %s, max_hw_sectors_kb %s" % (target, item['capacity'], item['logical_block'], item['nr_requests'], item['max_hw_kb']);
+   out_file = open(cache_file, 'w');
+   json.dump(cache, out_file, indent=3, sort_keys=True);
+   out_file.close();
+   return limits;
+
+# LimitWorkloads - size every workload of a target group to the probed limits of its
+#                  targets (FioWorkloadSpec.set_device_limits) and bound io_depth knee
+#                  searches so all jobs fit the request queue; returns the bounded knee
+#                  list and a description of each change, once per workload.
+def LimitWorkloads(limits, workload_list, fused_list, knee_list):
+   changes = [];
+   for [ sweep_name, sweep_items ] in [ [ None, workload_list ] ] + fused_list:
+      for workload in sweep_items:
+         changes.extend([ item for item in workload.set_device_limits(limits) if (item not in changes) ]);
+   workload_index = dict([ [ workload.Name, workload ] for workload in workload_list ]);
+   knee_limits    = {};
+   for knee_name, knee in knee_list.iteritems():
+      max_depth = None;
+      if (workload_index.has_key(knee_name)):
+         workload = workload_index[knee_name];
+         depth    = [ limits[target]['nr_requests'] for target in workload.TargetList if ((limits.get(target) or {}).get('nr_requests') is not None) ];
+         if (len(depth) > 0):
+            max_depth = max(1, min(depth) / workload.NumJobs);
+      if ((knee['option'] == "iodepth") and (max_depth is not None) and (knee['max'] > max_depth)):
+         changes.append("knee search %s io depth bounded by %d, its jobs share the requests its targets queue." % (knee_name, max_depth));
+         knee = dict(knee, max=max(knee['min'], max_depth));
+      knee_limits[knee_name] = knee;
+   return [ knee_limits, changes ];
 
 #############################################
 
 def AddArgs(parser_obj):
     parser_obj.add_argument('-o', dest='CfgOutFolder',  action='store', required=False, default="./out", help='Specify a folder to place output files into.');
     parser_obj.add_argument('-w', dest='CfgWorkloads',  action='store', required=False, type=argparse.FileType('r'), default=None, help='Override the default workload YAML based config file.');
-    parser_obj.add_argument('-t', dest='CfgTargetSeq',  action='store', required=True,  help='Specify a workload target spec to generate the fio scripts with; we can only process one target spec at a time.');
+    parser_obj.add_argument('-t', dest='CfgTargetSeq',  action='store', required=True,  help='Specify the workload target spec(s) to generate the fio scripts with: one group, a comma separated list or "all"; several groups are written to a subfolder per group.');
+    parser_obj.add_argument('-j', dest='CfgWorkers',    action='store', required=False, type=int, default=None, help='Number of worker processes generating target groups in parallel; one per CPU by default.');
+    parser_obj.add_argument('-f', dest='CfgFused',      action='store_true', required=False, default=False, help='Fuse each block and queue depth sweep into one stonewall chained fio job file, executed by a single fio invocation.');
+    parser_obj.add_argument('-T', dest='CfgTemplate',   action='store_true', required=False, default=False, help='Write one job template per sweep with ${VAR} references for bs, iodepth, numjobs, rwmixread and rate_iops; fio-exec.py sets them per run.  Ignored with -f.');
+    parser_obj.add_argument('-H', dest='CfgHistory',    action='store', required=False, default=None, help='Results history of fio-exec.py used to project run times; %s in the output folder by default.' % (CFG_HISTORY_FILE));
+    parser_obj.add_argument('-b', dest='CfgBudget',     action='store', required=False, default=None, help='Time budget, e.g. 72h or 3d; warn about sequences projected to exceed it.');
+    parser_obj.add_argument('-P', dest='CfgProbe',      action='store_true', required=False, default=False, help='Probe target limits from sysfs (cached by device WWN/serial in %s of the output folder) and size block sizes, io depths and fills to them.' % (CFG_PROBE_FILE));
+    parser_obj.add_argument('--reprobe', dest='CfgReprobe', action='store_true', required=False, default=False, help='With -P, probe the targets again instead of using cached probes.');
+    parser_obj.add_argument('-O', dest='CfgOrder',      action='store_true', required=False, default=False, help='Order each sequence by device state effect (fill, reads, sequential writes, random writes) with a single precondition fill.');
 
 def GetArgs():
     """;
@@ -331,32 +648,71 @@ def GetMultipleItems(item_string):
       items = None;
    return items;
 
+def GetOptionValue(value):
+   if (str(value).lower() == "false"):
+      return False;
+   if (str(value).lower() == "true"):
+      return True;
+   return value;
+
 def GetGlobals(global_obj, args):
-   args.Global = { 'group_reporting': True, 'reduce_tod': False };
+   args.Global = { 'group_reporting': True, 'reduce_tod': False, 'placement': "none", 'engine': "libaio" };
    if (global_obj is not None):
-      for key, value in global_obj.iter_items():
-         if (value.lower() == "false"):
-            args.Global[key] = False;
+      for key, value in global_obj.iteritems():
+         args.Global[key] = GetOptionValue(value);
+
+# ApplyWorkloadOptions - apply the global section to workloads generated from item_obj,
+#                        with any WORKLOAD_OPTIONS set on the item overriding the global.
+def ApplyWorkloadOptions(workloads, item_name, item_obj, args):
+   options = dict(args.Global);
+   for key in WORKLOAD_OPTIONS:
+      if (item_obj.get(key) is not None):
+         options[key] = GetOptionValue(item_obj[key]);
+   for workload in workloads:
+      workload.set_item(item_name);
+      workload.set_globals(options['group_reporting'], options['reduce_tod']);
+      workload.set_placement(options['placement'], options.get('cpus'), options.get('numa_nodes'));
+      workload.set_engine(options['engine']);
+      workload.set_steady_state(options.get('steady_state'), options.get('ss_dur', 30), options.get('ss_ramp', 0));
+      workload.set_ramp_time(options.get('ramp_time', 0));
+      workload.set_modifiers(options.get('log_lat', False) == True, options.get('log_iops', False) == True, options.get('log_bw', False) == True);
+      workload.set_log_options(options.get('log_avg_msec', 0), options.get('log_hist_msec', 0), options.get('log_hist_coarseness'),
+                               options.get('log_max_value', False), options.get('log_compression'), options.get('log_store_compressed', False));
+      workload.set_guards(options.get('guard_min_iops'), options.get('guard_max_p99_usec'), options.get('guard_max_errors'),
+                          options.get('guard_abort', "run"), options.get('guard_grace'));
 
 def GetSequenceList(seq_obj, args):
    args.SequenceList = {};
    if (seq_obj is not None):
-      for key, value in seq_obj.iter_items():
+      for key, value in seq_obj.iteritems():
          if (value is not None):
             if (value != ""):
                seq_items = value.strip(" \n\r").split(',');
                args.SequenceList[key] = seq_items;
 
-def ValidateSequenceList():
-   left off here - create validators to check for spelling errors, etc.
-   Next step: test parsing of new yaml file.
-
+# GetTargetGroups - a target group is either a comma separated device list, or an object
+#                   with the device list in 'targets' and an optional 'scale' list of
+#                   device counts to run each workload on.
 def GetTargetGroups(target_obj, args):
-   args.TargetGroups = {};
-   for key, value in target_obj:
+   args.TargetGroups   = {};
+   args.TargetScales   = {};
+   args.TargetCapacity = {};
+   for key, value in target_obj.iteritems():
+      scale_list = None;
+      if (isinstance(value, dict)):
+         if (value.get('scale') is not None):
+            scale_list = [ int(item) for item in GetMultipleItems(str(value['scale'])) ];
+         if (value.get('capacity') is not None):
+            args.TargetCapacity[key] = GetSizeValue(value['capacity']);
+         value = value['targets'];
       item_list = value.split(',');
       if (len(item_list) > 0):
          args.TargetGroups[key] = item_list;
+         if (scale_list is not None):
+            if (max(scale_list) > len(item_list)):
+               print "ERR: target group %s scales beyond its %d devices." % (key, len(item_list));
+               raise SystemExit(1);
+            args.TargetScales[key] = sorted(scale_list);
 
 def GetSweepParameters(sweep_obj, args):
    bs_list  = GetMultipleItems(sweep_obj['block_size']);
@@ -368,7 +724,7 @@ def GetSweepParameters(sweep_obj, args):
       run_time = sweep_obj['run_time'];
    else:
       run_time = "30";
-   return [ bs_list, qd_list, job_list, io_type, read_pct, run_time ];
+   return [ bs_list, qd_list, job_list, io_type, read_pct, run_time, args.TargetList ];
 
 def GetSingleParameters(single_obj, args):
    block_size  = single_obj['block_size'];
@@ -406,6 +762,267 @@ def ProcessQdSweepObj(qdsweep_obj, item_name, workload_list, args):
             workload_list.append(workload);
             sequence_id += 1;
 
+# Dimensions supported by the general 'sweep' section, outermost first by default, and
+# the tag appended to each value when naming the generated workloads.
+SWEEP_DIMENSIONS = [ [ 'num_targets', 't'    ],
+                     [ 'num_jobs',    'j'    ],
+                     [ 'read_pct',    'rd'   ],
+                     [ 'rate_iops',   'iops' ],
+                     [ 'io_depth',    'qd'   ],
+                     [ 'block_size',  ''     ] ];
+
+# Dimensions that are always part of a sweep workload name, others only when swept.
+SWEEP_NAME_DIMENSIONS = [ 'num_jobs', 'io_depth', 'block_size' ];
+
+def GetSweepDimension(sweep_obj, dim_name, args):
+   if (sweep_obj.get(dim_name) is not None):
+      return [ item.strip() for item in GetMultipleItems(str(sweep_obj[dim_name])) ];
+   if (dim_name == 'num_targets'):
+      return [ str(len(args.TargetList)) ];
+   if (dim_name == 'rate_iops'):
+      return [ "" ];
+   print "ERR: sweep parameter %s is not specified." % (dim_name);
+   raise SystemExit(1);
+
+# ExpandSweepObj - expand a general sweep item into workloads with the item's options
+#                  applied.  Every parameter listed in SWEEP_DIMENSIONS may hold a comma
+#                  separated list; every point of the cross product becomes a workload
+#                  unless it is pruned:
+#                  - max_outstanding: skip points where jobs * qd * targets exceeds it,
+#                                     before a workload is built for them.
+#                  - skip_covered:    skip points whose job was already generated by
+#                                     another item, as recorded in the 'covered' set of
+#                                     workload fingerprints.
+def ExpandSweepObj(sweep_obj, item_name, args, covered):
+   dim_tags = dict(SWEEP_DIMENSIONS);
+   if (sweep_obj.get('order') is not None):
+      dim_order = [ item.strip() for item in GetMultipleItems(sweep_obj['order']) ];
+   else:
+      dim_order = [ dim[0] for dim in SWEEP_DIMENSIONS ];
+   for dim_name in dim_tags.keys():
+      if (dim_name not in dim_order):
+         dim_order.append(dim_name);
+   dim_values = [];
+   for dim_name in dim_order:
+      if (not dim_tags.has_key(dim_name)):
+         print "ERR: unknown sweep dimension %s in %s" % (dim_name, item_name);
+         raise SystemExit(1);
+      dim_values.append(GetSweepDimension(sweep_obj, dim_name, args));
+   name_dims = [ dim_name for dim_name, values in zip(dim_order, dim_values)
+                 if ((len(values) > 1) or (dim_name in SWEEP_NAME_DIMENSIONS)) ];
+
+   io_type         = sweep_obj['io_type'];
+   run_time        = str(sweep_obj.get('run_time', "30"));
+   max_outstanding = int(sweep_obj.get('max_outstanding', 0));
+   skip_covered    = (str(sweep_obj.get('skip_covered', "false")).lower() == "true");
+
+   sequence_id = 0;
+   for point in itertools.product(*dim_values):
+      params      = dict(zip(dim_order, point));
+      num_targets = int(params['num_targets']);
+      if (num_targets > len(args.TargetList)):
+         continue;
+      outstanding = int(params['num_jobs']) * int(params['io_depth']) * num_targets;
+      if ((max_outstanding > 0) and (outstanding > max_outstanding)):
+         continue;
+      wkload_name = "%s-%02d_%s" % (item_name, sequence_id,
+                                    "-".join([ "%s%s" % (params[dim_name], dim_tags[dim_name]) for dim_name in name_dims ]));
+      workload = FioWorkloadSpec(False, wkload_name, params['block_size'], run_time, params['read_pct'], io_type,
+                                 params['io_depth'], params['num_jobs'], args.TargetList[:num_targets]);
+      workload.set_rate_iops(params['rate_iops']);
+      ApplyWorkloadOptions([ workload ], item_name, sweep_obj, args);
+      if (skip_covered and (workload.get_fingerprint() in covered)):
+         continue;
+      covered.add(workload.get_fingerprint());
+      sequence_id += 1;
+      yield workload;
+
+# Options a knee_search item may search over: fio option, executor environment variable
+# and the tag appended to each searched value when naming the measured runs.
+KNEE_OPTIONS = { 'io_depth': [ 'iodepth', 'FIO_IODEPTH', 'qd' ],
+                 'num_jobs': [ 'numjobs', 'FIO_NUMJOBS', 'j'  ] };
+
+# ProcessKneeSearchObj - a knee_search item is a single job file whose searched option is
+#                        left to the executor; io_depth or num_jobs gives the min,max
+#                        bounds of the search.
+def ProcessKneeSearchObj(knee_obj, item_name, workload_list, knee_list, args):
+   search = knee_obj.get('search', 'io_depth');
+   if (not KNEE_OPTIONS.has_key(search)):
+      print "ERR: unsupported knee search option %s in %s" % (search, item_name);
+      raise SystemExit(1);
+   [ fio_option, env_name, tag ] = KNEE_OPTIONS[search];
+   bounds = [ int(item) for item in GetMultipleItems(str(knee_obj[search])) ];
+   params = {};
+   for param in [ 'io_depth', 'num_jobs' ]:
+      params[param] = GetMultipleItems(str(knee_obj[param]))[0];
+   workload = FioWorkloadSpec(False, item_name, knee_obj['block_size'], str(knee_obj.get('run_time', "30")), knee_obj['read_pct'],
+                              knee_obj['io_type'], params['io_depth'], params['num_jobs'], args.TargetList);
+   workload.set_variable(fio_option, env_name);
+   workload_list.append(workload);
+   knee_list[item_name] = { 'option':         fio_option,
+                            'variable':       env_name,
+                            'tag':            tag,
+                            'min':            min(bounds),
+                            'max':            max(bounds),
+                            'gain_pct':       float(knee_obj.get('gain_pct', 5)),
+                            'sla_usec':       float(knee_obj.get('sla_usec', 0)),
+                            'resolution_pct': float(knee_obj.get('resolution_pct', 25)) };
+
+def ScaledName(name, num_devices):
+   return "%s-%dd" % (name, num_devices);
+
+# ScaleWorkloads - expand each workload into a device scaling series, run back to back
+#                  on the first N devices of the target group for each N in scale.  Size
+#                  based workloads (fills) precondition every device and are not scaled,
+#                  nor is a workload scaled beyond the devices it was defined for.
+#                  Returns the scaled workload, fused and knee lists along with the scale
+#                  list mapping each summary row to its series and device count.
+def ScaleWorkloads(scale, workload_list, fused_list, knee_list):
+   scaled_workloads = list();
+   scaled_fused     = list();
+   scaled_knees     = dict();
+   scale_list       = dict();
+   fused_names      = {};
+   for [ sweep_name, sweep_items ] in fused_list:
+      for workload in sweep_items:
+         fused_names[workload.Name] = sweep_name;
+   for workload in workload_list:
+      if (workload.SizeBased):
+         scaled_workloads.append(workload);
+         continue;
+      for num_devices in scale:
+         if (num_devices > workload.NumTargets):
+            continue;
+         name = ScaledName(workload.Name, num_devices);
+         scaled_workloads.append(workload.clone_targets(name, workload.TargetList[:num_devices]));
+         if (knee_list.has_key(workload.Name)):
+            scaled_knees[name] = knee_list[workload.Name];
+         else:
+            scale_list[name] = [ workload.Name, num_devices ];
+   for [ sweep_name, sweep_items ] in fused_list:
+      for num_devices in scale:
+         scaled_items = [ workload.clone_targets(ScaledName(workload.Name, num_devices), workload.TargetList[:num_devices])
+                          for workload in sweep_items if ((not workload.SizeBased) and (num_devices <= workload.NumTargets)) ];
+         if (len(scaled_items) > 0):
+            scaled_fused.append([ ScaledName(sweep_name, num_devices), scaled_items ]);
+   return [ scaled_workloads, scaled_fused, scaled_knees, scale_list ];
+
+# BuildWorkloads - expand every item of the workload YAML against args.TargetList into
+#                  [ workload_list, fused_list, knee_list ].
+def BuildWorkloads(yaml_obj, args):
+   workload_list = list();
+   fused_list    = list();
+   knee_list     = dict();
+   target_list   = args.TargetList;
+
+   # Process Single (non-sweeping) Items
+   for single_item in yaml_obj['fio-gen']['single']:
+      single_obj  = yaml_obj['fio-gen']['single'][single_item];
+      [ block_size, io_depth, num_jobs, io_type, read_pct, run_time ] = GetSingleParameters(single_obj, args);
+      # Create workload objects from information
+      workload = FioWorkloadSpec(False, single_item, block_size, run_time, read_pct, io_type, io_depth, num_jobs, target_list);
+      ApplyWorkloadOptions([ workload ], single_item, single_obj, args);
+      workload_list.append(workload);
+
+   # Process Block Sweep Items
+   for bsweep_item in yaml_obj['fio-gen']['block_sweep']:
+      bsweep_obj  = yaml_obj['fio-gen']['block_sweep'][bsweep_item];
+      first_index = len(workload_list);
+      ProcessBlockSweepObj(bsweep_obj, bsweep_item, workload_list, args);
+      ApplyWorkloadOptions(workload_list[first_index:], bsweep_item, bsweep_obj, args);
+      fused_list.append([ bsweep_item, workload_list[first_index:] ]);
+
+   # Process Queue Depth Sweep Items
+   for qdweep_item in yaml_obj['fio-gen']['qd_sweep']:
+      qdweep_obj  = yaml_obj['fio-gen']['qd_sweep'][qdweep_item];
+      first_index = len(workload_list);
+      ProcessQdSweepObj(qdweep_obj, qdweep_item, workload_list, args);
+      ApplyWorkloadOptions(workload_list[first_index:], qdweep_item, qdweep_obj, args);
+      fused_list.append([ qdweep_item, workload_list[first_index:] ]);
+
+   # Process General Sweep Items, pruning against everything generated so far
+   covered = set([ workload.get_fingerprint() for workload in workload_list ]);
+   for sweep_item in yaml_obj['fio-gen'].get('sweep', {}):
+      sweep_obj   = yaml_obj['fio-gen']['sweep'][sweep_item];
+      first_index = len(workload_list);
+      workload_list.extend(ExpandSweepObj(sweep_obj, sweep_item, args, covered));
+      print "Sweep %s expanded to %d workloads." % (sweep_item, len(workload_list) - first_index);
+      fused_list.append([ sweep_item, workload_list[first_index:] ]);
+
+   # Process Knee Search Items
+   for knee_item in yaml_obj['fio-gen'].get('knee_search', {}):
+      knee_obj = yaml_obj['fio-gen']['knee_search'][knee_item];
+      ProcessKneeSearchObj(knee_obj, knee_item, workload_list, knee_list, args);
+      ApplyWorkloadOptions(workload_list[-1:], knee_item, knee_obj, args);
+   return [ workload_list, fused_list, knee_list ];
+
+# RetargetWorkloads - workloads expanded for another target group of the same size, moved
+#                     onto target_list; every workload runs on a prefix of its group so
+#                     targets map by position.
+def RetargetWorkloads(workload_specs, target_list):
+   [ workload_list, fused_list, knee_list ] = workload_specs;
+   retarget = dict([ [ workload.Name, workload.clone_targets(workload.Name, target_list[:workload.NumTargets]) ] for workload in workload_list ]);
+   return [ [ retarget[workload.Name] for workload in workload_list ],
+            [ [ sweep_name, [ retarget[workload.Name] for workload in sweep_items ] ] for [ sweep_name, sweep_items ] in fused_list ],
+            knee_list ];
+
+# GenerateTargetGroup - write the job files and run plan of one target group from the
+#                       workloads expanded for its group size (gen_specs).  With several
+#                       groups this runs in a pool worker, into a subtree named after the
+#                       group, and returns its output instead of printing it.  Returns
+#                       [ group name, output, exit status, workload size changes ].
+def GenerateTargetGroup(group_name):
+   group_args = copy.copy(gen_args);
+   group_args.CfgTargetSeq = group_name;
+   group_args.TargetList   = gen_args.TargetGroups[group_name];
+   in_worker = (len(gen_groups) > 1);
+   changes   = [];
+   if (in_worker):
+      group_args.CfgOutFolder = "%s/%s" % (gen_args.CfgOutFolder, group_name);
+      sys.stdout = StringIO.StringIO();
+   try:
+      if (not os.path.exists(group_args.CfgOutFolder)):
+         os.mkdir(group_args.CfgOutFolder);
+      if (group_args.CfgHistory is None):
+         group_args.CfgHistory = "%s/%s" % (group_args.CfgOutFolder, CFG_HISTORY_FILE);
+      [ workload_list, fused_list, knee_list ] = RetargetWorkloads(gen_specs[len(group_args.TargetList)], group_args.TargetList);
+
+      # Generate script output, rewriting only what changed since the previous generation
+      scale_list = {};
+      if (group_args.TargetScales.has_key(group_name)):
+         [ workload_list, fused_list, knee_list, scale_list ] = ScaleWorkloads(group_args.TargetScales[group_name], workload_list, fused_list, knee_list);
+      if (len(group_args.DeviceLimits) > 0):
+         [ knee_list, changes ] = LimitWorkloads(group_args.DeviceLimits, workload_list, fused_list, knee_list);
+      template_list = [];
+      if (not group_args.CfgFused):
+         if (group_args.CfgTemplate):
+            template_list = fused_list;
+         fused_list = [];
+      GenerateFioScripts(group_args, workload_list, fused_list, knee_list, scale_list, template_list);
+      status = 0;
+   except SystemExit, exc:
+      status = exc.code;
+   except ValueError, exc:
+      print "ERR: %s" % (exc);
+      status = 1;
+   if (not in_worker):
+      return [ group_name, "", status, changes ];
+   output     = sys.stdout.getvalue();
+   sys.stdout = sys.__stdout__;
+   return [ group_name, output, status, changes ];
+
+# GetTargetSelection - target groups named by -t: one group, a comma separated list, or
+#                      "all" for every group of the YAML.
+def GetTargetSelection(args):
+   if (args.CfgTargetSeq == "all"):
+      return sorted(args.TargetGroups.keys());
+   groups = GetMultipleItems(args.CfgTargetSeq);
+   for group_name in groups:
+      if (not args.TargetGroups.has_key(group_name)):
+         print "ERR: unknown target group %s" % (group_name);
+         raise SystemExit(1);
+   return groups;
+
 # Determine how we were instantiated (command line, or included)
 CFG_FROM_CMD_LINE = False;
 if (sys.argv[0] == __file__):
@@ -423,15 +1040,9 @@ if (CFG_FROM_CMD_LINE):
            print "ERR: cannot create output folder %s" % (args.CfgOutFolder);
            raise SystemExit;
 
-   # Determine what our target spec is so we can create the proper workload spec.
-   # TODO: Get target groups
-   # TODO: Turn target specification (from command line) to target groups
-
-   # TODO: need to separate scripts by output folder; simple to simple, sweeps to sweeps
-   # TODO: create input config file for fio-exec.py and make fio-exec.py an actual editable script!
-
-   # create list of workload objects, from workload YAML config file.
-   workload_list = list();
+   # create list of workload objects, from workload YAML config file, once per distinct
+   # target group size; groups of the same size share them, see RetargetWorkloads.
+   gen_specs = dict();
    try:
       # Load workload definition from file or local (default) string
       if (args.CfgWorkloads is not None):
@@ -439,39 +1050,63 @@ if (CFG_FROM_CMD_LINE):
       else:
          yaml_obj = yaml.load(CFG_DEFAULT_WORKLOAD_YAML);
 
-      # Process Single (non-sweeping) Items
-      for single_item in yaml_obj['fio-gen']['single']:
-         single_obj  = yaml_obj['fio-gen']['single'][single_item];
-         [ block_size, io_depth, num_jobs, io_type, read_pct, run_time ] = GetSingleParameters(single_obj, args);
-         # Create workload objects from information
-         workload = FioWorkloadSpec(False, single_item, block_size, run_time, read_pct, io_type, io_depth, num_jobs, target_list);
-         workload_list.append(workload);
-
-      # Process Block Sweep Items
-      for bsweep_item in yaml_obj['fio-gen']['block_sweep']:
-         bsweep_obj  = yaml_obj['fio-gen']['block_sweep'][bsweep_item];
-         ProcessBlockSweepObj(bsweep_obj, bsweep_item, workload_list, args);
-
-      # Process Queue Depth Sweep Items
-      for qdweep_item in yaml_obj['fio-gen']['qd_sweep']:
-         qdweep_obj  = yaml_obj['fio-gen']['qd_sweep'][qdweep_item];
-         ProcessQdSweepObj(qdweep_obj, qdweep_item, workload_list, args);
+      # Resolve the requested target groups to their device lists
+      GetTargetGroups(yaml_obj['fio-gen']['target_groups'], args);
+      gen_groups = GetTargetSelection(args);
+      args.DeviceLimits = {};
+      if (args.CfgProbe):
+         args.DeviceLimits = ProbeTargets(args, sorted(set(sum([ args.TargetGroups[group_name] for group_name in gen_groups ], []))));
+      GetGlobals(yaml_obj['fio-gen'].get('global'), args);
+      GetSequenceList(yaml_obj['fio-gen'].get('sequence'), args);
+      for group_name in gen_groups:
+         target_list = args.TargetGroups[group_name];
+         if (not gen_specs.has_key(len(target_list))):
+            args.TargetList = target_list;
+            gen_specs[len(target_list)] = BuildWorkloads(yaml_obj, args);
 
    except yaml.YAMLError, exc:
       print "Error in workload definition file: %s" % (exc);
+   except ValueError, exc:
+      print "ERR: %s" % (exc);
+      raise SystemExit(1);
 
-   if (len(workload_list) == 0):
+   if ((len(gen_specs) == 0) or (0 in [ len(specs[0]) for specs in gen_specs.values() ])):
       print "ERR: invalid workload config file format in %s" % (args.CfgWorkloads.name);
       raise SystemExit(1);
 
-   # Validate sequences against workload definitions; make sure they all exist.
-   # Warn if they don't exist but are NOT selected as target sequence.
-   # Fail if they don't exist AND ARE selected as target sequence.
-   # TODO: implement
-
-   # Generate script output
-   print "Clearing previous scripts from output folder: %s" % (args.CfgOutFolder);
-   subprocess.call(["rm -rf %s/*.fio" % (args.CfgOutFolder)], shell=True);
-   GenerateFioScripts(args, workload_list);
+   gen_args = args;
+   if (len(gen_groups) == 1):
+      results = [ GenerateTargetGroup(gen_groups[0]) ];
+   else:
+      # fan the target groups out over worker processes, forked with the expanded specs
+      num_workers = min(len(gen_groups), args.CfgWorkers or multiprocessing.cpu_count());
+      print "Generating %d target groups with %d workers..." % (len(gen_groups), num_workers);
+      pool    = multiprocessing.Pool(num_workers);
+      results = pool.map(GenerateTargetGroup, gen_groups);
+      pool.close();
+      pool.join();
+   failed  = [];
+   changes = [];
+   for [ group_name, output, status, group_changes ] in results:
+      if (output != ""):
+         print "=== target group %s ===" % (group_name);
+         sys.stdout.write(output);
+      if (status not in [ 0, None ]):
+         failed.append(group_name);
+      changes.extend([ item for item in group_changes if (item not in changes) ]);
+   # groups sharing workloads and devices report the same change, print each once
+   for item in changes:
+      print "WARNING: %s" % (item);
+   if (len(failed) > 0):
+      print "ERR: generation failed for target group(s) %s" % (",".join(failed));
+      raise SystemExit(1);
+   if (len(gen_groups) > 1):
+      # fio-exec.py -g in the parent folder schedules the target group subfolders
+      manifest = LoadManifest(args.CfgOutFolder);
+      in_file  = open("%s/fio-exec.py" % (os.path.dirname(os.path.abspath(__file__))), 'r');
+      WriteFioScript("%s/fio-exec.py" % (args.CfgOutFolder), in_file.read(), manifest, newline=False);
+      in_file.close();
+      os.chmod("%s/fio-exec.py" % (args.CfgOutFolder), 0755);
+      SaveManifest(args.CfgOutFolder, manifest);
 
    raise SystemExit(0);
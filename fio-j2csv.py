@@ -0,0 +1,116 @@
+#! /usr/bin/python
+
+# fio-j2csv.py - re-parse the JSON output of a fio-exec.py run into a csv table indexed by
+# workload parameters instead of workload names, using the run plan generated by
+# fio-gen.py.  Runs that have no output yet (e.g. a partial sequence) are skipped.
+#
+#   ./fio-j2csv.py                 - parse every run of the plan into json/params.csv
+#   ./fio-j2csv.py -s all_rd       - parse only the runs of a sequence (or comma separated sequences).
+#   ./fio-j2csv.py -d 20240131-0915 - parse an earlier run directory instead of json/latest.
+#
+
+import json
+import argparse
+import os, sys
+import glob
+
+CFG_DEF_PLAN_FILE = "fio-plan.json";
+# Pointer to the newest run directory written by fio-exec.py.
+CFG_LATEST_LINK   = "latest";
+
+# Workload parameters written in front of the results, in column order; adjusted lists the
+# requested values fio-gen.py -P changed to fit the targets, e.g. "iodepth 32>16".
+PARAM_COLUMNS = [ 'bs', 'iodepth', 'numjobs', 'rw', 'rwmixread', 'rate_iops', 'runtime', 'engine', 'placement', 'adjusted' ];
+
+# Input arguments
+def AddArgs(parser_obj):
+   parser_obj.add_argument('-s', dest='CfgSequence', action='store', required=False, default=None, help='Specify sequence(s) to parse, comma separated; all workloads in plan order by default.');
+   parser_obj.add_argument('-p', dest='CfgPlanFile', action='store', required=False, default=CFG_DEF_PLAN_FILE, help='Run plan generated by fio-gen.py; %s by default.' % (CFG_DEF_PLAN_FILE));
+   parser_obj.add_argument('-d', dest='CfgRunFolder', action='store', required=False, default=CFG_LATEST_LINK, help='Run directory of fio-exec.py in the output folder; %s by default.' % (CFG_LATEST_LINK));
+
+def GetArgs():
+   # create the top-level parser
+   parser = argparse.ArgumentParser(description='fio JSON output to csv parser input arguments.');
+   AddArgs(parser);
+   # parse the args and call whatever function was selected
+   args = parser.parse_args();
+   return args;
+
+def LoadJson(json_file):
+   in_file = open(json_file, 'r');
+   j_data  = json.load(in_file);
+   in_file.close();
+   return j_data;
+
+# GroupResults - [ read bw, read iops, write bw, write iops ] of each reporting group.
+def GroupResults(j_data):
+   group_ids = [];
+   group_res = [];
+   for job in j_data["jobs"]:
+      if (job["groupid"] in group_ids):
+         continue;
+      group_ids.append(job["groupid"]);
+      group_res.append([ job["read"]["bw"], job["read"]["iops"], job["write"]["bw"], job["write"]["iops"] ]);
+   return group_res;
+
+# RunOutputs - json outputs of a run: <id>.json, then <id>.<n>.json of each later execution
+#              of a run listed again by the executed sequences, n its run list position.
+def RunOutputs(out_folder, run_id):
+   later = {};
+   for json_file in glob.glob("%s/%s.*.json" % (out_folder, run_id)):
+      suffix = os.path.basename(json_file)[len(run_id) + 1:-len(".json")];
+      if (suffix.isdigit()):
+         later[int(suffix)] = json_file;
+   return [ "%s/%s.json" % (out_folder, run_id) ] + [ later[key] for key in sorted(later.keys()) ];
+
+def ParamRow(row_name, run, params, res):
+   values = [ params.get(column) for column in PARAM_COLUMNS ];
+   values = [ "" if (value is None) else str(value) for value in values ];
+   return "%s,%s,%d,%s,%s,%s,%s,%s\n" % (row_name, run['item'], len(params['targets']), ",".join(values), res[0], res[1], res[2], res[3]);
+
+#############################################
+
+args = GetArgs();
+if (not os.path.exists(args.CfgPlanFile)):
+   print "ERR: run plan %s not found; generate it with fio-gen.py." % (args.CfgPlanFile);
+   raise SystemExit(1);
+plan       = LoadJson(args.CfgPlanFile);
+out_folder = "%s/%s" % (plan['out_folder'], args.CfgRunFolder);
+if (not os.path.isdir(out_folder)):
+   print "ERR: run directory %s not found; execute the plan with fio-exec.py first." % (out_folder);
+   raise SystemExit(1);
+run_list   = plan['runs'];
+if (args.CfgSequence is not None):
+   run_ids  = sum([ plan['sequences'][seq_name] for seq_name in args.CfgSequence.split(',') ], []);
+   run_list = [ run for run in run_list if (run['id'] in run_ids) ];
+
+# Parse each json output file for iops and bw
+csv_str  = "Workload,Item,num_targets,%s,Read_BW,Read_IOPS,Write_BW,Write_IOPS\n" % (",".join(PARAM_COLUMNS));
+
+print "Parsing output folder: %s ..." % (out_folder);
+for run in run_list:
+   if (run.has_key('knee')):
+      # each knee search point is its own json file, named after the searched value
+      knee = run['knee'];
+      for json_file in sorted(glob.glob("%s/%s_*%s.json" % (out_folder, run['id'], knee['tag']))):
+         row_name = os.path.basename(json_file)[:-len(".json")];
+         value    = row_name[len(run['id']) + 1:-len(knee['tag'])];
+         if (not value.isdigit()):
+            continue;
+         params   = dict(run['rows'][0]['params']);
+         params[knee['option']] = int(value);
+         csv_str += ParamRow(row_name, run, params, GroupResults(LoadJson(json_file))[0]);
+      continue;
+   for json_file in RunOutputs(out_folder, run['id']):
+      if (not os.path.exists(json_file)):
+         continue;
+      for row, res in zip(run['rows'], GroupResults(LoadJson(json_file))):
+         csv_str += ParamRow(row['name'], run, row['params'], res);
+
+out_file_name = "%s/params.csv" % (out_folder);
+print "Saving output to CSV: %s" % (out_file_name);
+csv_file = open(out_file_name, "w");
+csv_file.write(csv_str);
+csv_file.close();
+
+print "Summary complete."
@@ -1,6 +1,8 @@
 #! /usr/local/bin/python
 
 import argparse
+import subprocess
+import json
 import os, sys, time
 
 sys.path.append('./libs/');
@@ -9,10 +11,18 @@ from remote_exec import SvrRemoteControl, SvrRemoteThread;
 # Defaults can be overridden via the command line.
 CFG_DEF_TARGET_USER   = "root";
 CFG_DEF_TARGET_PWD    = "vmware";
+# fio --server pid file on each client VM, see StartServers.
+CFG_SERVER_PID_FILE   = "/tmp/fio-server.pid";
 
 def AddArgs(parser_obj):
    parser_obj.add_argument('-u', '--user',   dest='CfgUserName', action='store', required=False, default=CFG_DEF_TARGET_USER, help='ESXi host (SSH) user name (root).');
    parser_obj.add_argument('-p', '--pwd',    dest='CfgUserPwd',  action='store', required=False, default=CFG_DEF_TARGET_PWD,  help='ESXi (SSH) user password (root).');
+   parser_obj.add_argument('-c', '--clients', dest='CfgClients', action='store', nargs='*', required=False, default=None, help='Coordinator mode: VMs to drive through fio client/server, one fio invocation per job file for all of them.');
+   parser_obj.add_argument('-j', '--jobs',    dest='CfgJobFiles', action='store', nargs='*', required=False, default=[], help='Coordinator mode: local fio job files to run on every client, in order.');
+   parser_obj.add_argument('-o', '--out',     dest='CfgOutFolder', action='store', required=False, default="./out", help='Coordinator mode: folder for the fio json output and clients.csv.');
+   parser_obj.add_argument('-r', '--repeat',  dest='CfgRepeat', action='store', type=int, required=False, default=1, help='Coordinator mode: number of times to run the job files.');
+   parser_obj.add_argument('--no-start',      dest='CfgNoStart', action='store_true', required=False, default=False, help='Coordinator mode: fio --server is already running on the clients, do not SSH to start it.');
+   parser_obj.add_argument('--stop',          dest='CfgStop', action='store_true', required=False, default=False, help='Coordinator mode: stop fio --server on the clients when done.');
 
 def GetArgs():
    # create the top-level parser
@@ -35,6 +45,84 @@ def ExecFioThread(rc, params):
    ret_code, out_str = rc.rexec_v(params['exec_str']);
    return [ ret_code, out_str ];
 
+# StartServers - start fio --server once on each client VM over SSH, unless it is already
+#                running; the only SSH session per VM in coordinator mode.
+def StartServers(clients):
+   for host in clients:
+      rc = SvrRemoteControl(host, args.CfgUserName, args.CfgUserPwd, auto_connect=True, exit_on_error=True);
+      # check the daemon's pid, a pattern match on the command line would match this shell
+      rc.rexec_v("kill -0 $(cat %s 2> /dev/null) 2> /dev/null || fio --server --daemonize=%s" % (CFG_SERVER_PID_FILE, CFG_SERVER_PID_FILE));
+      rc.close();
+
+def StopServers(clients):
+   for host in clients:
+      rc = SvrRemoteControl(host, args.CfgUserName, args.CfgUserPwd, auto_connect=True, exit_on_error=False);
+      if (rc.is_connected()):
+         rc.rexec_v("kill $(cat %s)" % (CFG_SERVER_PID_FILE));
+         rc.close();
+
+# ClientRows - one csv row per client of a client/server json output plus the aggregate
+#              of all clients, which fio reports as "All clients" when there are several.
+def ClientRows(run_name, j_data):
+   csv_rows = "";
+   totals   = [ 0, 0, 0, 0 ];
+   found    = False;
+   for job in j_data.get("client_stats", []):
+      res = [ job["read"]["bw"], job["read"]["iops"], job["write"]["bw"], job["write"]["iops"] ];
+      if (job.get("jobname") == "All clients"):
+         found = True;
+         csv_rows += "%s,ALL,%s,%s,%s,%s\n" % (run_name, res[0], res[1], res[2], res[3]);
+         continue;
+      totals    = [ total + value for total, value in zip(totals, res) ];
+      csv_rows += "%s,%s,%s,%s,%s,%s\n" % (run_name, job.get("hostname", ""), res[0], res[1], res[2], res[3]);
+   if (not found):
+      csv_rows += "%s,ALL,%s,%s,%s,%s\n" % (run_name, totals[0], totals[1], totals[2], totals[3]);
+   return csv_rows;
+
+# CoordinateClients - run each job file on every client VM at once through fio client mode;
+#                     fio returns the time aligned per client and aggregate results in one
+#                     json file per run, so nothing is collected from the VMs afterwards.
+def CoordinateClients():
+   if (len(args.CfgJobFiles) == 0):
+      print "ERR: coordinator mode needs job files (-j).";
+      raise SystemExit(1);
+   if (not os.path.exists(args.CfgOutFolder)):
+      os.mkdir(args.CfgOutFolder);
+   if (not args.CfgNoStart):
+      StartServers(args.CfgClients);
+   host_file = "%s/fio-clients.list" % (args.CfgOutFolder);
+   out_file  = open(host_file, "w");
+   out_file.write("".join([ "%s\n" % (host) for host in args.CfgClients ]));
+   out_file.close();
+
+   csv_str = "Workload,Client,Read_BW,Read_IOPS,Write_BW,Write_IOPS\n";
+   for ii in range(1, args.CfgRepeat + 1):
+      print "Repeat Job Loop #%d" % (ii);
+      for job_file in args.CfgJobFiles:
+         run_name  = "%s-%d" % (os.path.splitext(os.path.basename(job_file))[0], ii);
+         json_file = "%s/%s.json" % (args.CfgOutFolder, run_name);
+         print "---------- running %s on %d clients ------------" % (job_file, len(args.CfgClients));
+         e_code = subprocess.call([ "fio", "--client=%s" % (host_file), "--output-format=json", "--output=%s" % (json_file), job_file ]);
+         if ((e_code != 0) or (not os.path.exists(json_file))):
+            print "ERR: fio client run of %s failed with exit code %d" % (job_file, e_code);
+            continue;
+         in_file = open(json_file, "r");
+         csv_str += ClientRows(run_name, json.load(in_file));
+         in_file.close();
+   if (args.CfgStop):
+      StopServers(args.CfgClients);
+
+   out_file_name = "%s/clients.csv" % (args.CfgOutFolder);
+   print "Saving client results to CSV: %s" % (out_file_name);
+   print csv_str;
+   out_file = open(out_file_name, "w");
+   out_file.write(csv_str);
+   out_file.close();
+
+if (args.CfgClients is not None):
+   CoordinateClients();
+   raise SystemExit(0);
+
 job_list = [ { "host" : "10.28.240.164", "exec_str" : "cd /home/vmware/Desktop/ ; fio wc-fill-640qd.fio" },
              { "host" : "10.28.240.195", "exec_str" : "cd /home/vmware/Desktop/ ; sleep 60  ; fio wc-fill-640qd.fio" },
              { "host" : "10.28.240.204", "exec_str" : "cd /home/vmware/Desktop/ ; sleep 120 ; fio wc-fill-640qd.fio" },
@@ -0,0 +1,533 @@
+#! /usr/bin/python
+
+# fio workload specification and job file rendering, shared by fio-gen.py and by anything
+# that wants to build fio jobs in memory.  Only the python standard library is used so
+# this can be imported on a minimal proxy VM; YAML parsing stays in fio-gen.py.
+#
+#   sys.path.append('./libs/');
+#   from fio_workload import FioWorkloadSpec
+#
+#   workload = FioWorkloadSpec(False, "rrd-4k", "4k", "60", "100", "Random", "32", "8", [ "/dev/sdb" ]);
+#   workload.set_engine("io_uring");
+#   job_txt  = workload.to_fio();
+#
+
+"""
+fio workload specification and job file rendering.
+"""
+
+import copy
+import hashlib
+
+# Placement policies understood by FioWorkloadSpec.set_placement.
+PLACEMENT_POLICIES = [ "none", "spread", "pack", "per_device", "numa" ];
+
+# IO engine profiles understood by FioWorkloadSpec.set_engine, and the options each emits.
+ENGINE_PROFILES = { "libaio":          [ "ioengine=libaio" ],
+                    "io_uring":        [ "ioengine=io_uring" ],
+                    "io_uring_fixed":  [ "ioengine=io_uring", "fixedbufs", "registerfiles" ],
+                    "io_uring_poll":   [ "ioengine=io_uring", "fixedbufs", "registerfiles", "hipri" ],
+                    "io_uring_sqpoll": [ "ioengine=io_uring", "fixedbufs", "registerfiles", "sqthread_poll" ],
+                    "sync":            [ "ioengine=sync" ],
+                    "psync":           [ "ioengine=psync" ] };
+
+# fio steady state metrics accepted by FioWorkloadSpec.set_steady_state.
+STEADY_STATE_METRICS = [ "iops", "iops_slope", "bw", "bw_slope" ];
+
+# Effect of a workload on device state, see FioWorkloadSpec.get_device_effect; measurements
+# are ordered by this list after a fill so each one finds the state it expects.
+DEVICE_EFFECTS = [ "read", "seq_write", "rand_write" ];
+
+# What a tripped guard rail stops, see FioWorkloadSpec.set_guards.
+GUARD_ABORT = [ "run", "sequence" ];
+
+# Job options a workload template leaves to the executor, and the environment variable
+# fio expands for each, see FioWorkloadSpec.to_template.
+TEMPLATE_VARIABLES = [ [ 'bs', "FIO_BS" ], [ 'iodepth', "FIO_IODEPTH" ], [ 'numjobs', "FIO_NUMJOBS" ],
+                       [ 'rwmixread', "FIO_RWMIXREAD" ], [ 'rate_iops', "FIO_RATE_IOPS" ] ];
+
+# Summary columns labelling how each workload was run, see FioWorkloadSpec.get_labels.
+LABEL_COLUMNS = [ 'Placement', 'Engine', 'Ramp_s' ];
+
+class FioWorkloadSpec:
+    'Container for storing and generating fio-r.py workload and job definition.'
+    def __init__(self, en_short, name, blk_sz, run_time, read_pct, io_type, io_depth, num_jobs, target_list=[]):
+        self.Name = name;
+        # Populate default values.
+        self.BlockSize   = blk_sz;
+        self.ReadPct     = int(read_pct);
+        self.IoDepth     = int(io_depth);
+        self.NumJobs     = int(num_jobs);
+        self.TargetList  = target_list;
+        self.NumTargets  = len(target_list);
+        self.EnLatency   = False;
+        self.EnIops      = False;
+        self.EnBandwidth = False;
+        self.GroupReport = True;
+        self.ReduceTOD   = False;
+        self.RateIops    = None;
+        self.Variables   = {};
+        self.Placement   = "none";
+        self.CpuList     = None;
+        self.NumaNodes   = None;
+        self.Engine      = "libaio";
+        self.SteadyState = None;
+        self.SsDuration  = None;
+        self.SsRamp      = None;
+        self.RampTime    = 0;
+        self.LogOptions  = {};
+        self.Guards      = None;
+        self.DeviceLimits = {};
+        self.Adjusted    = {};
+        self.Item        = name;
+        self.set_short_run(en_short);
+        self.set_io_type(io_type);
+        self.set_run_time(int(run_time));
+
+    def set_globals(self, group_reporting=True, reduce_tod=False):
+        self.GroupReport = group_reporting;
+        self.ReduceTOD   = reduce_tod;
+
+    def set_modifiers(self, en_lat = False, en_iops = False, en_bw = False):
+        self.EnLatency   = en_lat;
+        self.EnIops      = en_iops;
+        self.EnBandwidth = en_bw;
+        if (en_lat or en_iops or en_bw):
+            self.ReduceTOD = False;
+
+    # set_log_options - bound the volume of the lat/iops/bw logs and optionally add a
+    #                   completion latency histogram log:
+    #   avg_msec:         average log samples over this many msec instead of logging every IO.
+    #   hist_msec:        write a histogram log every hist_msec (0 disables).
+    #   hist_coarseness:  merge histogram bins, 2^coarseness bins per sample.
+    #   max_value:        log the max instead of the average of each averaging window.
+    #   compression:      compress logs in memory in chunks of this size, e.g. "4M".
+    #   store_compressed: keep logs compressed on disk (.fz, decompress with fio --inflate-log).
+    def set_log_options(self, avg_msec=0, hist_msec=0, hist_coarseness=None, max_value=False, compression=None, store_compressed=False):
+        self.LogOptions = { 'avg_msec':         int(avg_msec),
+                            'hist_msec':        int(hist_msec),
+                            'hist_coarseness':  hist_coarseness,
+                            'max_value':        (max_value == True),
+                            'compression':      compression,
+                            'store_compressed': (store_compressed == True) };
+        if (self.LogOptions['hist_msec'] > 0):
+            self.ReduceTOD = False;
+
+    def set_short_run(self, en_short):
+        if (en_short):
+            print "WARNING: enabling SHORT run on workload %s" % (self.Name);
+            self.RunTime = 2;
+        self.EnShort = en_short;
+
+    def set_io_type(self, io_type):
+        io_type = io_type.lower();
+        if ((io_type == "random") or (io_type == "rand")):
+            io_type = "randrw";
+        elif ((io_type == "sequential") or (io_type == "seq")):
+            io_type = "readwrite";
+        else:
+            io_type = "*unknown*";
+        self.IoType = io_type;
+
+    def set_run_time(self, run_time):
+        # determine if we are to fill the drive, or not.
+        if (run_time == -1):
+            self.SizeBased  = True;
+        else:
+            self.SizeBased  = False;
+        # override runtime if this is a short run.
+        if (self.EnShort):
+            self.RunTime = 2;
+        else:
+            self.RunTime = int(run_time);
+
+    # set_placement - CPU and NUMA placement of each target section.
+    #   none:       leave all job threads floating across every CPU.
+    #   spread:     split the job threads over cpus, one CPU per thread.
+    #   pack:       share the (few) cpus between all job threads.
+    #   per_device: pin each target to its own slice of cpus.
+    #   numa:       bind each target's CPUs and memory to a node of numa_nodes,
+    #               assigned round robin by target order.
+    def set_placement(self, placement="none", cpus=None, numa_nodes=None):
+        placement = str(placement).lower();
+        if (placement not in PLACEMENT_POLICIES):
+            raise ValueError("unknown placement %s on workload %s" % (placement, self.Name));
+        if ((placement in [ "spread", "pack", "per_device" ]) and (cpus is None)):
+            raise ValueError("placement %s on workload %s requires a cpus list." % (placement, self.Name));
+        if ((placement == "numa") and (numa_nodes is None)):
+            raise ValueError("placement numa on workload %s requires a numa_nodes list." % (self.Name));
+        self.Placement = placement;
+        self.CpuList   = cpus;
+        if (numa_nodes is not None):
+            self.NumaNodes = [ item.strip() for item in str(numa_nodes).split(',') ];
+
+    def set_engine(self, engine="libaio"):
+        engine = str(engine).lower();
+        if (not ENGINE_PROFILES.has_key(engine)):
+            raise ValueError("unknown engine %s on workload %s" % (engine, self.Name));
+        self.Engine = engine;
+
+    # set_steady_state - end the workload early once fio detects steady state, e.g.
+    #                    "iops_slope:0.3%" over ss_dur seconds after ss_ramp seconds; the
+    #                    run_time (or device fill) becomes the upper bound.
+    def set_steady_state(self, criterion=None, duration=30, ramp=0):
+        if ((criterion is None) or (str(criterion) == "")):
+            self.SteadyState = None;
+            return;
+        if (str(criterion).split(':')[0] not in STEADY_STATE_METRICS):
+            raise ValueError("unknown steady state criterion %s on workload %s" % (criterion, self.Name));
+        self.SteadyState = str(criterion);
+        self.SsDuration  = int(duration);
+        self.SsRamp      = int(ramp);
+
+    # set_ramp_time - seconds of warm-up to run before statistics are collected.
+    def set_ramp_time(self, ramp_time=0):
+        self.RampTime = int(ramp_time);
+
+    # set_guards - live limits fio-exec.py checks against each fio status report once grace
+    #              seconds have passed (by default ramp_time plus one status interval, the
+    #              first interval fully after the ramp, left to fio-exec.py): below min_iops, above
+    #              max_p99_usec completion latency or more than max_errors errors stops the
+    #              run, and with abort "sequence" skips the rest of its sequence too.
+    def set_guards(self, min_iops=None, max_p99_usec=None, max_errors=None, abort="run", grace=None):
+        if ((min_iops is None) and (max_p99_usec is None) and (max_errors is None)):
+            self.Guards = None;
+            return;
+        abort = str(abort).lower();
+        if (abort not in GUARD_ABORT):
+            raise ValueError("unknown guard abort %s on workload %s; use one of %s" % (abort, self.Name, ", ".join(GUARD_ABORT)));
+        self.Guards = { 'min_iops':     min_iops if (min_iops is None) else float(min_iops),
+                        'max_p99_usec': max_p99_usec if (max_p99_usec is None) else float(max_p99_usec),
+                        'max_errors':   max_errors if (max_errors is None) else int(max_errors),
+                        'abort':        abort,
+                        'grace':        grace if (grace is None) else int(grace) };
+
+    # set_device_limits - size the workload to the limits probed from its targets, a dict
+    #                     by target (see fio-gen.py ProbeTargets).  The block size is
+    #                     rounded up to a multiple of the largest logical block size, so
+    #                     direct=1 IO stays aligned, and down to the smallest request
+    #                     (max_hw_sectors_kb); io depth is clamped so all jobs together fit
+    #                     the smallest request queue (nr_requests); a fill writes exactly the
+    #                     capacity of each target.  Options left to the executor
+    #                     (set_variable) are kept.  Returns a description of each change,
+    #                     the requested values are kept in Adjusted for the run plan.
+    def set_device_limits(self, limits):
+        self.DeviceLimits = limits;
+        changes = [];
+        known   = [ limits[target] for target in self.TargetList if (limits.get(target) is not None) ];
+        if (len(known) == 0):
+            return changes;
+        block = GetBlockBytes(self.BlockSize);
+        if ((block is not None) and (not self.Variables.has_key('bs'))):
+            min_block = max([ 512 ] + [ item['logical_block'] for item in known if (item.get('logical_block') is not None) ]);
+            max_block = [ item['max_hw_kb'] * 1024 for item in known if (item.get('max_hw_kb') is not None) ];
+            new_block = ((block + min_block - 1) / min_block) * min_block;
+            if (len(max_block) > 0):
+                new_block = max(min_block, min(new_block, min(max_block) - min(max_block) % min_block));
+            if (new_block != block):
+                changes.append("workload %s block size %s adjusted to %s for its targets." % (self.Name, self.BlockSize, FormatBlockSize(new_block)));
+                self.Adjusted.setdefault('bs', self.BlockSize);
+                self.BlockSize = FormatBlockSize(new_block);
+        depth = [ item['nr_requests'] for item in known if (item.get('nr_requests') is not None) ];
+        if ((len(depth) > 0) and (not self.Variables.has_key('iodepth'))):
+            # every job queues its own iodepth requests to the same targets
+            max_depth = max(1, min(depth) / self.NumJobs);
+            if (self.IoDepth > max_depth):
+                changes.append("workload %s io depth %d clamped to %d, %d jobs share the %d requests its targets queue." % (self.Name, self.IoDepth, max_depth, self.NumJobs, min(depth)));
+                self.Adjusted.setdefault('iodepth', self.IoDepth);
+                self.IoDepth = max_depth;
+        return changes;
+
+    def set_rate_iops(self, rate_iops):
+        if ((rate_iops is None) or (str(rate_iops) == "")):
+            self.RateIops = None;
+        else:
+            self.RateIops = int(rate_iops);
+
+    # set_variable - emit the fio option as an environment variable reference, ${env_name},
+    #                which fio expands when it parses the job file.
+    def set_variable(self, fio_option, env_name):
+        self.Variables[fio_option] = env_name;
+
+    # to_template - job file of this workload with the TEMPLATE_VARIABLES options left as
+    #               ${VAR} references, named family_name, and the environment that turns it
+    #               back into this workload.  Workloads of a sweep that differ only in those
+    #               options render the same template.
+    def to_template(self, family_name):
+        workload = self.clone_targets(family_name, self.TargetList);
+        workload.Variables = dict(self.Variables);
+        values   = { 'bs': self.BlockSize, 'iodepth': self.IoDepth, 'numjobs': self.NumJobs,
+                     'rwmixread': self.ReadPct, 'rate_iops': self.RateIops };
+        env      = {};
+        for [ fio_option, env_name ] in TEMPLATE_VARIABLES:
+            if ((values[fio_option] is None) or workload.Variables.has_key(fio_option)):
+                continue;
+            workload.set_variable(fio_option, env_name);
+            env[env_name] = str(values[fio_option]);
+        return [ workload.to_fio(), env ];
+
+    # clone_targets - copy of this workload, renamed, that runs against target_list.
+    def clone_targets(self, name, target_list):
+        workload = copy.copy(self);
+        workload.Name       = name;
+        workload.TargetList = target_list;
+        workload.NumTargets = len(target_list);
+        workload.Adjusted   = dict(self.Adjusted);
+        return workload;
+
+    # set_item - name of the workload definition (YAML item) this workload was generated
+    #            from, which is how sequences refer to it.
+    def set_item(self, item_name):
+        self.Item = item_name;
+
+    def get_name(self):
+        return self.Name;
+
+    # get_expected_time - seconds the workload runs for, None when it runs until the
+    #                     targets are filled.
+    def get_expected_time(self):
+        if (self.SizeBased):
+            return None;
+        return self.RunTime + self.RampTime;
+
+    # get_plan_params - parameters of this workload as recorded in the run plan.
+    def get_plan_params(self):
+        return { 'bs':         self.BlockSize,
+                 'iodepth':    self.IoDepth,
+                 'numjobs':    self.NumJobs,
+                 'rw':         self.IoType,
+                 'rwmixread':  self.ReadPct,
+                 'rate_iops':  self.RateIops,
+                 'runtime':    self.RunTime,
+                 'size_based': self.SizeBased,
+                 'ramp_time':  self.RampTime,
+                 'engine':     self.Engine,
+                 'placement':  self.Placement,
+                 'adjusted':   ";".join([ "%s %s>%s" % (option, self.Adjusted[option], { 'bs': self.BlockSize, 'iodepth': self.IoDepth }[option]) for option in sorted(self.Adjusted.keys()) ]) or None,
+                 'targets':    self.TargetList };
+
+    # get_device_effect - how this workload changes the device state: "fill" writes every
+    #                     block (size based), "read" leaves it as is, "seq_write" rewrites
+    #                     it sequentially and "rand_write" fragments it for the reads after.
+    def get_device_effect(self):
+        if (self.ReadPct >= 100):
+            return "read";
+        if (self.SizeBased):
+            return "fill";
+        if (self.IoType == "readwrite"):
+            return "seq_write";
+        return "rand_write";
+
+    # get_fingerprint - hash of the job this workload renders to, independent of its name,
+    #                   so identical workloads from different items or sequences match.
+    def get_fingerprint(self):
+        workload = self.clone_targets("workload", self.TargetList);
+        return hashlib.sha1(workload.to_fio()).hexdigest();
+
+    def fio_global_opts(self):
+        script_txt  = ("thread\n"
+                       "direct=1\n"
+                       "norandommap=1\n"
+                       "refill_buffers\n");
+        script_txt += "".join([ "%s\n" % (option) for option in ENGINE_PROFILES[self.Engine] ]);
+        if (not self.SizeBased):
+            script_txt += "time_based\n";
+
+        if (self.GroupReport):
+            script_txt  += "group_reporting\n"
+
+        if (self.ReduceTOD):
+            script_txt += "gtod_reduce=1\n";
+
+        if (self.SteadyState is not None):
+            script_txt += "ss=%s\nss_dur=%d\nss_ramp=%d\n" % (self.SteadyState, self.SsDuration, self.SsRamp);
+        return script_txt;
+
+    def fio_log_opts(self):
+        script_txt = "";
+        if (self.EnLatency or self.EnIops or self.EnBandwidth):
+            if (self.EnLatency):
+                script_txt += "write_lat_log=%s\n" % (self.Name);
+            if (self.EnIops):
+                script_txt += "write_iops_log=%s\n" % (self.Name);
+            if (self.EnBandwidth):
+                script_txt += "write_bw_log=%s\n" % (self.Name);
+        if (self.LogOptions.get('hist_msec', 0) > 0):
+            script_txt += "write_hist_log=%s\nlog_hist_msec=%d\n" % (self.Name, self.LogOptions['hist_msec']);
+            if (self.LogOptions['hist_coarseness'] is not None):
+                script_txt += "log_hist_coarseness=%s\n" % (self.LogOptions['hist_coarseness']);
+        if (script_txt != ""):
+            if (self.LogOptions.get('avg_msec', 0) > 0):
+                script_txt += "log_avg_msec=%d\n" % (self.LogOptions['avg_msec']);
+            if (self.LogOptions.get('max_value', False)):
+                script_txt += "log_max_value=1\n";
+            if (self.LogOptions.get('compression') is not None):
+                script_txt += "log_compression=%s\n" % (self.LogOptions['compression']);
+            if (self.LogOptions.get('store_compressed', False)):
+                script_txt += "log_store_compressed=1\n";
+        return script_txt;
+
+    def fio_run_opts(self):
+        script_txt = "runtime=%s\n" % (self.RunTime);
+        if (self.RampTime > 0):
+            script_txt += "ramp_time=%d\n" % (self.RampTime);
+        return script_txt;
+
+    def fio_job_opts(self):
+        script_txt = "";
+        for [ fio_option, value ] in [ [ 'bs', self.BlockSize ], [ 'numjobs', self.NumJobs ], [ 'iodepth', self.IoDepth ] ]:
+            if (self.Variables.has_key(fio_option)):
+                value = "${%s}" % (self.Variables[fio_option]);
+            script_txt += "%s=%s\n" % (fio_option, value);
+        if (self.Variables.has_key('rate_iops')):
+            script_txt += "rate_iops=${%s}\n" % (self.Variables['rate_iops']);
+        elif (self.RateIops is not None):
+            script_txt += "rate_iops=%d\n" % (self.RateIops);
+        return script_txt;
+
+    def fio_mix_opts(self):
+        read_pct = self.ReadPct;
+        if (self.Variables.has_key('rwmixread')):
+            read_pct = "${%s}" % (self.Variables['rwmixread']);
+        return "rw=%s\nrwmixread=%s\n" % (self.IoType, read_pct);
+
+    def fio_target_opts(self, index):
+        if (self.Placement == "spread"):
+            return "cpus_allowed=%s\ncpus_allowed_policy=split\n" % (self.CpuList);
+        if (self.Placement == "pack"):
+            return "cpus_allowed=%s\ncpus_allowed_policy=shared\n" % (self.CpuList);
+        if (self.Placement == "per_device"):
+            cpu_list  = GetCpuList(self.CpuList);
+            num_cpus  = max(1, len(cpu_list) / max(1, self.NumTargets));
+            first_cpu = (index * num_cpus) % len(cpu_list);
+            cpu_slice = cpu_list[first_cpu:first_cpu + num_cpus];
+            return "cpus_allowed=%s\ncpus_allowed_policy=shared\n" % (",".join([ str(cpu) for cpu in cpu_slice ]));
+        if (self.Placement == "numa"):
+            node = self.NumaNodes[index % len(self.NumaNodes)];
+            return "numa_cpu_nodes=%s\nnuma_mem_policy=local\n" % (node);
+        return "";
+
+    # fio_size_opts - bound a fill to the probed capacity of its target, rounded down to a
+    #                 whole block, so the last IO is not cut short at the end of the device.
+    def fio_size_opts(self, target):
+        limits = self.DeviceLimits.get(target);
+        if ((not self.SizeBased) or (limits is None) or (not limits.get('capacity'))):
+            return "";
+        block = GetBlockBytes(self.BlockSize) or limits.get('logical_block') or 512;
+        return "size=%d\n" % (limits['capacity'] - limits['capacity'] % block);
+
+    # get_labels - values for the executor summary LABEL_COLUMNS of this workload.
+    def get_labels(self):
+        return [ self.Placement, self.Engine, str(self.RampTime) ];
+
+    def to_fio(self):
+        script_txt  = "[global]\n";
+        script_txt += self.fio_global_opts();
+        script_txt += self.fio_log_opts();
+        script_txt += self.fio_run_opts();
+        script_txt += self.fio_job_opts();
+        script_txt += "%s\n" % (self.fio_mix_opts());
+
+        for index, target in enumerate(self.TargetList):
+            script_txt += "[%s]\nfilename=%s\n%s%s\n" % (target.replace('/', '_'), target, self.fio_size_opts(target), self.fio_target_opts(index));
+        return script_txt;
+
+    # to_fio_fused - emit only the target sections of this workload, for appending to a
+    #                fused sweep job file (see FusedFioScript).  The first target section
+    #                waits for all previous sweep points to finish and opens a new
+    #                reporting group, the remaining targets run alongside it.
+    def to_fio_fused(self):
+        script_txt = "";
+        first      = True;
+        for index, target in enumerate(self.TargetList):
+            script_txt += "[%s%s]\nfilename=%s\n" % (self.Name, target.replace('/', '_'), target);
+            script_txt += self.fio_size_opts(target);
+            script_txt += self.fio_target_opts(index);
+            if (first):
+                script_txt += "stonewall\nnew_group\n";
+                first = False;
+            script_txt += self.fio_job_opts();
+            script_txt += self.fio_mix_opts();
+            script_txt += "%s\n" % (self.fio_log_opts());
+        return script_txt;
+
+    def __str__(self):
+        script_txt   = "# AUTOGENERATED BY %s\n" % (__file__);
+        script_txt   = "# WORKLOAD NAME: %s\n" % (self.Name);
+        script_txt  += "BLOCK_SIZE: %s\n" % (self.BlockSize);
+        script_txt  += "RUN_TIME: %d\n" % (self.RunTime);
+        script_txt  += "READ_PCT: %d\n" % (self.ReadPct);
+        script_txt  += "IO_TYPE: %s\n" % (self.IoType);
+        script_txt  += "IO_DEPTH: %d\n" % (self.IoDepth);
+        script_txt  += "NUM_JOBS: %d\n" % (self.NumJobs);
+        script_txt  += "NUM_TARGETS: %d\n" % (self.NumTargets);
+        if (self.TargetList is not None):
+            if (len(self.TargetList) >= self.NumTargets):
+                script_txt += "TARGET_LIST: ";
+                last_index  = self.NumTargets - 1;
+                curr_index  = 0;
+                for target in self.TargetList:
+                    script_txt += "%s" % (target);
+                    if (curr_index != last_index):
+                        script_txt += ",";
+                    else:
+                        # There may be fewer targets in the list
+                        # than are requested for testing!
+                        break;
+                    curr_index += 1;
+                script_txt += "\n";
+            else:
+                raise ValueError("workload %s needs %d targets, its target list has %d." % (self.Name, self.NumTargets, len(self.TargetList)));
+        flag_str     = "False";
+        if (self.SizeBased):
+            flag_str = "True";
+        script_txt  += "SIZE_BASED: %s\n" % (flag_str);
+        return script_txt;
+
+#############################################
+
+# GetBlockBytes - bytes of a fio block size such as "4k", "128K", "1m" or "4096"; None for
+#                 anything else, e.g. ranges or per direction sizes.
+def GetBlockBytes(size_str):
+   units    = { 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3 };
+   size_str = str(size_str).strip().lower().replace("ib", "").rstrip('b');
+   scale    = 1;
+   if ((len(size_str) > 0) and units.has_key(size_str[-1])):
+      scale    = units[size_str[-1]];
+      size_str = size_str[:-1];
+   if (not size_str.isdigit()):
+      return None;
+   return int(size_str) * scale;
+
+# FormatBlockSize - fio block size of a byte count, in KiB when it is a whole number of them.
+def FormatBlockSize(num_bytes):
+   if (num_bytes % 1024 == 0):
+      return "%dk" % (num_bytes / 1024);
+   return "%d" % (num_bytes);
+
+# GetCpuList - expand a fio style cpu list, e.g. "0-3,8", to a list of cpu numbers.
+def GetCpuList(cpu_str):
+   cpu_list = [];
+   for item in str(cpu_str).split(','):
+      if ('-' in item):
+         [ first, last ] = item.split('-');
+         cpu_list.extend(range(int(first), int(last) + 1));
+      else:
+         cpu_list.append(int(item));
+   return cpu_list;
+
+# FusedFioScript - build a single job file for all points of a sweep.  Sweep points share
+#                  io type and run time so those live in [global]; each point is chained
+#                  behind the previous one with stonewall so a single fio process runs
+#                  the whole sweep, started and parsing the job file once; each point's
+#                  job sections still open their targets and allocate their buffers.
+def FusedFioScript(workload_list):
+   if (len(workload_list) == 0):
+      raise ValueError("a fused job file needs at least one sweep point.");
+   first_item  = workload_list[0];
+   script_txt  = "[global]\n";
+   script_txt += first_item.fio_global_opts();
+   script_txt += "%s\n" % (first_item.fio_run_opts());
+   for workload in workload_list:
+      script_txt += workload.to_fio_fused();
+   return script_txt;